@@ -1,29 +1,106 @@
 # final_route.py
+import time
 from flask import Flask
-from config import Config
+from config import Config, engine_options, sqlite_pragmas, use_sqlite_pragmas
 from models import db
-from doc.swagger_docs import configure_swagger
+from doc.swagger_docs import configure_swagger, docs_cli
 from router import add_routes
+from migrations import run_migrations, schema_version, latest_version, schema_cli
+from importer import import_cli
+from utils.cache import entity_cache
+from utils.invalidation import invalidation_log
+from utils.compression import response_compressor
+from utils.etag import configure_etags
+from utils.json_provider import configure_json
+from utils.suggestions import suggestion_engine
+from utils.hashing import password_hasher
+from utils.tokens import token_auth
+from utils.replicas import replica_router
+from replicas import replica_cli
+
+
+# Drop the pooled connections of every engine. A pre-fork server calls this
+# in each worker with close=False (see gunicorn.conf.py): the connections
+# were copied from the master, whose sockets must stay open.
+def dispose_engines(app, close=True):
+    for bind in [None] + replica_router.binds:
+        db.get_engine(app, bind).dispose(close=close)
+
+
+# Bring the schema up to date according to SCHEMA_ON_STARTUP. The version
+# stamp is checked first, so an up-to-date database costs a single query.
+def prepare_schema(app):
+    mode = app.config['SCHEMA_ON_STARTUP']
+    if mode == 'off':
+        return
+    if mode not in ('migrate', 'check'):
+        raise ValueError("Unknown SCHEMA_ON_STARTUP mode '{}'".format(mode))
+
+    version = schema_version(db.engine)
+    if version >= latest_version():
+        return
+    if mode == 'check':
+        raise RuntimeError(
+            "Database schema is at version {}, the app needs {}; "
+            "run `flask schema upgrade`.".format(version, latest_version()))
+    for version, name in run_migrations(db.engine):
+        app.logger.info("Applied migration %s: %s", version, name)
 
 
 def create_app():
+    started = last = time.perf_counter()
+    timings = {}
+
+    # Milliseconds spent since the previous phase ended
+    def phase(name):
+        nonlocal last
+        now = time.perf_counter()
+        timings[name] = round((now - last) * 1000, 2)
+        last = now
+
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    phase('config')
 
+    replica_router.init_app(app)
     db.init_app(app)
-
-    configure_swagger(app)
+    invalidation_log.init_app(app)
+    entity_cache.init_app(app)
+    suggestion_engine.init_app(app)
+    password_hasher.init_app(app)
+    token_auth.init_app(app)
+    configure_json(app)
+    # Registered before the ETag hook so it runs after it (after_request
+    # hooks run in reverse) and sees the final ETag
+    response_compressor.init_app(app)
+    configure_etags(app)
+    phase('extensions')
 
     with app.app_context():
-        # Create all tables in the single database
-        db.create_all()
-        print("Created tables in the database")
-
-        if db.engine.dialect.name == 'sqlite':
-            with db.engine.connect() as connection:
-                connection.connection.execute('PRAGMA foreign_keys = ON')
+        pragmas = sqlite_pragmas(app.config)
+        use_sqlite_pragmas(db.engine, pragmas)
+        for bind in replica_router.binds:
+            use_sqlite_pragmas(db.get_engine(app, bind), dict(pragmas, query_only='ON'))
+        prepare_schema(app)
+    phase('schema')
 
     add_routes(app)
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(import_cli)
+    app.cli.add_command(replica_cli)
+    app.cli.add_command(docs_cli)
+    phase('routes')
+
+    if app.config['DOCS_ENABLED']:
+        configure_swagger(app)
+    phase('docs')
+
+    # Startup-time breakdown in milliseconds, also logged once
+    timings['total'] = round((last - started) * 1000, 2)
+    app.extensions['startup_timings'] = timings
+    app.logger.info("App built in %.1f ms (%s)", timings['total'], ', '.join(
+        '{} {:.1f}'.format(name, ms) for name, ms in timings.items() if name != 'total'))
 
     return app
 
@@ -0,0 +1,131 @@
+# asgi.py
+#
+# ASGI entry point: `uvicorn asgi:app --workers 2`.
+#
+# The read routes registered by `add_async_routes` run as coroutines against
+# the async database driver, so thousands of open (or slow) connections cost
+# a few KB each instead of an OS thread. Every other request, including all
+# writes, is handed to the regular Flask app on asgiref's thread pool; those
+# views are unchanged and share the process with the async ones.
+import io
+import sys
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+from app import create_app
+from router import add_async_routes
+from utils.async_db import async_db
+from utils.invalidation import invalidation_log
+
+
+# WSGI environ for a body-less ASGI HTTP request, so the async views can run
+# inside an ordinary Flask request context.
+def wsgi_environ(scope):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+class AsyncReadApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.url_map = Map()
+        self.views = {}
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    def add_url_rule(self, rule, endpoint, view):
+        self.url_map.add(Rule(rule, endpoint=endpoint, methods=['GET']))
+        self.views[endpoint] = view
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            try:
+                endpoint, args = self.url_map.bind('localhost').match(
+                    scope['path'], method='GET')
+            except HTTPException:
+                pass
+            else:
+                response = await self.dispatch(scope, self.views[endpoint], args)
+                if response is not None:
+                    return await self.send_response(scope, send, response)
+
+        await self.wsgi(scope, receive, send)
+
+    # Run an async view through Flask's own request pipeline (before_request
+    # hooks, response conversion, after_request hooks, error handling), so its
+    # responses are indistinguishable from the synchronous view's. Returns
+    # None when the view declines the request.
+    async def dispatch(self, scope, view, args):
+        environ = wsgi_environ(scope)
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                # Ahead of the before_request hooks, without blocking the loop
+                await invalidation_log.poll_async(async_db.engine())
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**args)
+                    if rv is None:
+                        return None
+                return app.process_response(app.make_response(rv))
+            except Exception as e:
+                return app.handle_exception(e)
+
+    async def send_response(self, scope, send, response):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response.headers.items()],
+        })
+        body = b'' if scope['method'] == 'HEAD' else response.get_data()
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_db.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app():
+    flask_app = create_app()
+    async_db.init_app(flask_app)
+
+    asgi_app = AsyncReadApp(flask_app)
+    add_async_routes(asgi_app)
+    return asgi_app
+
+
+app = create_asgi_app()
@@ -1,13 +1,267 @@
 from dotenv import load_dotenv
 import os
+from sqlalchemy import event
+from sqlalchemy.engine import URL
+from sqlalchemy.pool import QueuePool
 load_dotenv()
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 
+# Environment lookups; unset and empty variables (as in the .env template)
+# both fall back to the default.
+def _env(name, default=None):
+    value = os.environ.get(name, '').strip()
+    return value or default
+
+
+def _env_int(name, default):
+    value = _env(name)
+    return int(value) if value is not None else default
+
+
+def _env_bool(name, default):
+    value = _env(name)
+    return value.lower() in ('1', 'true', 'yes', 'on') if value is not None else default
+
+
+# The database URL: DB_URL if set; otherwise built from DB_HOST, DB_PORT,
+# DB_USER, DATABSE_PASS and DB_NAME with the DB_DRIVER dialect (PostgreSQL by
+# default); otherwise the bundled SQLite file.
+def database_url():
+    url = _env('DB_URL')
+    if url:
+        # SQLAlchemy only accepts the postgresql:// spelling
+        if url.startswith('postgres://'):
+            url = 'postgresql://' + url[len('postgres://'):]
+        return url
+    if _env('DB_HOST') and _env('DB_NAME'):
+        return URL.create(
+            drivername=_env('DB_DRIVER', 'postgresql'),
+            username=_env('DB_USER'),
+            password=_env('DATABSE_PASS', _env('DATABASE_PASS')),
+            host=_env('DB_HOST'),
+            port=_env_int('DB_PORT', None),
+            database=_env('DB_NAME'),
+        ).render_as_string(hide_password=False)
+    return 'sqlite:///' + os.path.join(BASE_DIR, 'database/app.db')
+
+
 class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = 'your_secret_key'
+    # Signs the access tokens issued by /login; SECRET_KEY or the SECURITY_KEY
+    # entry of .env. Without a key, /login does not issue tokens.
+    SECRET_KEY = _env('SECRET_KEY', _env('SECURITY_KEY'))
+
+    SQLALCHEMY_DATABASE_URI = database_url()
+
+    # SQL statement logging; keep off in production
+    SQLALCHEMY_ECHO = _env_bool('DB_ECHO', False)
+
+    # Read replicas (comma-separated URIs in DB_READ_REPLICAS) serving GET
+    # requests; a client that wrote reads from the primary for
+    # READ_YOUR_WRITES_SECONDS afterwards (see utils/replicas.py)
+    SQLALCHEMY_READ_REPLICAS = [uri.strip() for uri in _env('DB_READ_REPLICAS', '').split(',') if uri.strip()]
+    READ_YOUR_WRITES_SECONDS = _env_int('READ_YOUR_WRITES_SECONDS', 5)
+
+    # Connection pool per process (see engine_options); all overridable
+    # from the environment variables of the same name
+    DB_POOL_SIZE = _env_int('DB_POOL_SIZE', 5)
+    DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = _env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 1800)
+    DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', True)
+
+    # Server-side limits on PostgreSQL and MySQL: seconds to establish a
+    # connection, milliseconds per statement (0 disables)
+    DB_CONNECT_TIMEOUT = _env_int('DB_CONNECT_TIMEOUT', 10)
+    DB_STATEMENT_TIMEOUT = _env_int('DB_STATEMENT_TIMEOUT', 30000)
+
+    # SQLite tuning applied to every new connection: a preset from
+    # SQLITE_PROFILES, with individual PRAGMAs overridden by SQLITE_PRAGMAS
+    SQLITE_PROFILE = _env('SQLITE_PROFILE', 'balanced')
+    SQLITE_PRAGMAS = {}
+
+    # What create_app() does about the schema. Every mode starts by reading
+    # the schema version stamp (one query):
+    #   migrate - apply pending migrations when the stamp is behind
+    #   check   - refuse to start when the stamp is behind; a release step
+    #             runs `flask schema upgrade` instead
+    #   off     - do not touch the database at startup
+    # MIGRATE_ON_STARTUP=0 is still honoured as `off`.
+    SCHEMA_ON_STARTUP = _env(
+        'SCHEMA_ON_STARTUP', 'migrate' if _env_bool('MIGRATE_ON_STARTUP', True) else 'off')
+
+    # Serve the Swagger UI and /apispec_1.json. When off, flasgger is never
+    # imported and the app starts faster.
+    DOCS_ENABLED = _env_bool('DOCS_ENABLED', True)
+
+    # Source of /apispec_1.json: 'runtime' renders it once on first request,
+    # 'static' only serves the file written by `flask docs build`
+    DOCS_SPEC = _env('DOCS_SPEC', 'runtime')
+    DOCS_SPEC_FILE = _env('DOCS_SPEC_FILE', os.path.join(BASE_DIR, 'doc', 'openapi.json'))
+    DOCS_SPEC_MAX_AGE = _env_int('DOCS_SPEC_MAX_AGE', 86400)
+
+    # Encoder for every JSON response: 'orjson' (falls back to 'stdlib' when
+    # orjson is not installed) or 'stdlib'
+    JSON_BACKEND = _env('JSON_BACKEND', 'orjson')
+
+    # Compress responses of at least COMPRESSION_MIN_SIZE bytes with the
+    # client's preferred encoding, in this order of preference ('br' needs the
+    # brotli package; an empty list disables compression). Compressed bodies
+    # of the COMPRESSION_CACHE_SIZE most recent ETags are kept for reuse.
+    COMPRESSION_MIN_SIZE = _env_int('COMPRESSION_MIN_SIZE', 1024)
+    COMPRESSION_ENCODINGS = ['br', 'gzip']
+    COMPRESSION_CACHE_SIZE = 256
+
+    # Keyset pagination for list endpoints
+    PAGE_DEFAULT_LIMIT = 100
+    PAGE_MAX_LIMIT = 1000
+
+    # Rows fetched per round trip when streaming full-table exports
+    STREAM_CHUNK_SIZE = 1000
+
+    # Share entity cache, suggestion and token invalidations between worker
+    # processes through the `invalidation` table (utils/invalidation.py).
+    # Needed by every multi-process server; gunicorn.conf.py turns it on when
+    # it runs more than one worker. Each process reads the table at most once
+    # every INVALIDATION_POLL_MS, which bounds how late it sees another
+    # worker's write (0: before every request).
+    SHARED_INVALIDATION = _env_bool('SHARED_INVALIDATION', False)
+    INVALIDATION_POLL_MS = _env_int('INVALIDATION_POLL_MS', 1000)
+
+    # Read-through cache for single-resource GETs (0 disables it)
+    ENTITY_CACHE_SIZE = 10000
+    ENTITY_CACHE_TTL = 60
+    # How long past expiry an entry may still be served if the DB is down
+    ENTITY_CACHE_STALE_TTL = 600
+
+    # Package suggestion engine
+    SUGGEST_DEFAULT_LIMIT = 10
+    SUGGEST_MAX_LIMIT = 100
+    SUGGEST_REFRESH_SECONDS = 300
+    SUGGEST_WEIGHTS = {'price': 1.0, 'rating': 1.0, 'location': 2.0, 'procedure': 3.0}
+
+    # Largest payload accepted by the POST /<resource>/batch routes
+    BATCH_MAX_ITEMS = 1000
+
+    # Rows per transaction for `flask catalog import`
+    IMPORT_BATCH_SIZE = 5000
+
+    # Password hashing (PBKDF2-SHA256) in a process pool
+    PASSWORD_HASH_ITERATIONS = 600000
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_MAX_PENDING = 32
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Signed access tokens issued by /login
+    TOKEN_MAX_AGE = 3600
+    TOKEN_CACHE_SIZE = 10000
+
+    # Longest range answered by /clinics/<id>/availability
+    AVAILABILITY_MAX_DAYS = 366
+
+    # Connections in the async engine used by the ASGI read routes (asgi.py)
+    ASYNC_DB_POOL_SIZE = 10
+
+
+# SQLite PRAGMA presets. All use WAL, so readers never block behind a writer
+# and a writer only waits for other writers (up to busy_timeout ms instead of
+# failing with "database is locked"):
+# - durable: fsync on every commit (synchronous=FULL), modest caches.
+# - balanced: fsync at checkpoints only (synchronous=NORMAL; a power loss can
+#   drop the last commits but never corrupts), 64 MB page cache, 256 MB mmap.
+# - read-heavy: balanced with a 256 MB page cache and 1 GB of mmap, for
+#   catalogs that are read far more than written.
+# cache_size is negative, i.e. in KiB rather than pages.
+SQLITE_PROFILES = {
+    'durable': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'foreign_keys': 'ON',
+    },
+    'balanced': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    },
+    'read-heavy': {
+        'busy_timeout': 10000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -262144,
+        'mmap_size': 1073741824,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    },
+}
+
+
+def sqlite_pragmas(config):
+    profile = config['SQLITE_PROFILE']
+    if profile not in SQLITE_PROFILES:
+        raise ValueError("Unknown SQLITE_PROFILE '{}'; expected one of {}".format(
+            profile, ', '.join(SQLITE_PROFILES)))
+    return dict(SQLITE_PROFILES[profile], **config['SQLITE_PRAGMAS'])
+
+
+# Run `pragmas` on every connection `engine` opens (a no-op for other
+# databases). PRAGMAs are per connection, so they have to be applied as each
+# pooled connection is created rather than once at startup.
+def use_sqlite_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
+
+
+# SQLAlchemy engine options built from the DB_* settings. Pools are per
+# process, so under a pre-fork server each worker holds up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW connections of its own. File-based SQLite is
+# pooled as well (pysqlite would otherwise open a connection per checkout);
+# pooled connections may be handed to another thread, hence
+# check_same_thread=False. In-memory SQLite keeps Flask-SQLAlchemy's defaults.
+# The timeouts are passed as psycopg2 / mysqlclient connect arguments.
+def engine_options(config):
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    dialect = uri.split(':', 1)[0].split('+', 1)[0]
+    connect_args = {}
+    if dialect == 'sqlite':
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        connect_args['check_same_thread'] = False
+    elif dialect == 'postgresql':
+        connect_args['connect_timeout'] = config['DB_CONNECT_TIMEOUT']
+        if config['DB_STATEMENT_TIMEOUT']:
+            connect_args['options'] = '-c statement_timeout={}'.format(
+                config['DB_STATEMENT_TIMEOUT'])
+    elif dialect in ('mysql', 'mariadb'):
+        connect_args['connect_timeout'] = config['DB_CONNECT_TIMEOUT']
+        if config['DB_STATEMENT_TIMEOUT']:
+            connect_args['init_command'] = 'SET SESSION max_execution_time={}'.format(
+                config['DB_STATEMENT_TIMEOUT'])
 
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + \
-        os.path.join(BASE_DIR, 'database/app.db')
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': connect_args,
+    }
+    if dialect == 'sqlite':
+        options['poolclass'] = QueuePool
+    return options
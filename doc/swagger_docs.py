@@ -1,13 +1,144 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+
+# flasgger's endpoint for /apispec_1.json
+SPEC_ENDPOINT = 'flasgger.apispec_1'
+
+
+# Attach an OpenAPI spec dict to a view, like flasgger's own `swag_from`, but
+# without importing flasgger; its Swagger extension reads the same
+# `specs_dict` attribute when (and only when) docs are enabled.
+def swag_from(specs):
+    def decorator(function):
+        function.specs_dict = specs
+        return function
+    return decorator
+
+
+# The rendered spec: compact JSON bytes, a gzip copy and a content hash.
+class RenderedSpec:
+    def __init__(self, body, gzipped=None):
+        self.body = body
+        self.gzipped = gzipped or gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha1(body).hexdigest()
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(json.dumps(spec, sort_keys=True, separators=(',', ':')).encode())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            body = f.read()
+        gzipped = None
+        if os.path.exists(path + '.gz'):
+            with open(path + '.gz', 'rb') as f:
+                gzipped = f.read()
+        return cls(body, gzipped)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.body)
+        with open(path + '.gz', 'wb') as f:
+            f.write(self.gzipped)
+
+
+# Serves /apispec_1.json in place of flasgger's view, which rebuilds and
+# re-encodes the spec on every request.
+#
+# DOCS_SPEC picks where the spec comes from:
+#   runtime - flasgger walks the views once, on the first request
+#   static  - the file written by `flask docs build`; nothing is generated
+#             at runtime (production)
+# Either way every request is answered from the same bytes (gzipped when the
+# client accepts it) with an ETag and DOCS_SPEC_MAX_AGE caching.
+class SpecServer:
+    def __init__(self, app, swagger):
+        self.swagger = swagger
+        self.runtime = False
+        self.max_age = app.config['DOCS_SPEC_MAX_AGE']
+        self._spec = None
+        self._lock = threading.Lock()
+
+        mode = app.config['DOCS_SPEC']
+        if mode == 'runtime':
+            self.runtime = True
+        elif mode == 'static':
+            path = app.config['DOCS_SPEC_FILE']
+            if os.path.exists(path):
+                self._spec = RenderedSpec.load(path)
+            else:
+                app.logger.warning("DOCS_SPEC is 'static' but %s does not exist; "
+                                   "run `flask docs build`", path)
+        else:
+            raise ValueError("Unknown DOCS_SPEC mode '{}'".format(mode))
+
+    def render(self):
+        return RenderedSpec.from_dict(self.swagger.get_apispecs())
+
+    def spec(self):
+        if self._spec is None and self.runtime:
+            with self._lock:
+                if self._spec is None:
+                    self._spec = self.render()
+        return self._spec
+
+    def view(self):
+        spec = self.spec()
+        if spec is None:
+            return current_app.response_class(
+                '{"message":"API spec not built."}', status=404, mimetype='application/json')
+
+        if 'gzip' in request.accept_encodings:
+            response = current_app.response_class(spec.gzipped, mimetype='application/json')
+            response.content_encoding = 'gzip'
+            response.set_etag(spec.etag + '-gzip')
+        else:
+            response = current_app.response_class(spec.body, mimetype='application/json')
+            response.set_etag(spec.etag)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response.make_conditional(request)
 
-from flasgger import Swagger
 
 def configure_swagger(app):
+    from flasgger import Swagger
+
     app.config['SWAGGER'] = {
         'title': 'Cosmetic Odyssey API',
         'uiversion': 3,
         'description': 'This is the API documentation for this Flask-based backend server.',
         'version': '1.0',
     }
-    Swagger(app) 
+    swagger = Swagger(app)
+
+    server = SpecServer(app, swagger)
+    app.view_functions[SPEC_ENDPOINT] = server.view
+    app.extensions['openapi_spec'] = server
 
     return app
+
+
+docs_cli = AppGroup('docs', help='Build the API documentation.')
+
+
+@docs_cli.command('build')
+@click.option('--output', default=None, help='Defaults to DOCS_SPEC_FILE.')
+def build(output):
+    """Render the OpenAPI spec to a static file for DOCS_SPEC=static."""
+    app = current_app._get_current_object()
+    server = app.extensions.get('openapi_spec')
+    if server is None:
+        raise click.ClickException("Docs are disabled (DOCS_ENABLED=0).")
+    path = output or app.config['DOCS_SPEC_FILE']
+    spec = server.render()
+    spec.save(path)
+    click.echo('Wrote {} ({} bytes, {} gzipped)'.format(
+        path, len(spec.body), len(spec.gzipped)))
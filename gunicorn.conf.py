@@ -0,0 +1,43 @@
+# gunicorn.conf.py
+#
+# Pre-fork production server:
+#   gunicorn -c gunicorn.conf.py                                           # WSGI
+#   gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app  # ASGI
+#
+# The app is imported once in the master (preload_app), which is also where
+# pending migrations run; workers are forked from it with the schema already
+# in place and drop the master's pooled connections on fork (post_fork).
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+preload_app = True
+
+# One worker per core by default; each serves WEB_THREADS requests at once,
+# so keep DB_POOL_SIZE at least as large as the thread count.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+# Workers keep their own entity caches and token revocations; share their
+# invalidations (see utils/invalidation.py). Read by Config when the app is
+# preloaded, which happens after this file runs.
+if workers > 1:
+    os.environ.setdefault('SHARED_INVALIDATION', '1')
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth (caches, fragmentation)
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+# The preloaded app's pools hold connections opened in the master; each
+# worker drops its copies, without closing the master's sockets, and opens
+# its own.
+def post_fork(server, worker):
+    from app import dispose_engines
+    app = worker.app.wsgi()
+    dispose_engines(getattr(app, 'flask_app', app), close=False)
@@ -0,0 +1,198 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from models import db, Clinic, Hotel, Package
+from utils.bulk import existing_ids, existing_keys, insert_rows
+from utils.terms import add_clinic_specialties, add_hotel_amenities
+
+# Streaming catalog import: `flask catalog import clinics clinics.csv`.
+#
+# Records are read lazily from CSV or NDJSON and inserted `--batch-size` at a
+# time, one transaction per batch. After each commit the number of records
+# consumed is written to a checkpoint file, so `--resume` continues after the
+# last committed batch. Rows whose natural key already exists are skipped,
+# which also makes re-running an import idempotent.
+
+KINDS = {
+    'clinics': {
+        'model': Clinic,
+        'key': ('name', 'location'),
+        'fields': ('name', 'location', 'contact_info', 'specialties', 'price_range', 'ratings'),
+        'json': ('contact_info', 'specialties'),
+        'float': ('ratings',),
+    },
+    'hotels': {
+        'model': Hotel,
+        'key': ('name', 'location'),
+        'fields': ('name', 'location', 'amenities', 'price_range', 'ratings'),
+        'json': ('amenities',),
+        'float': ('ratings',),
+    },
+    'packages': {
+        'model': Package,
+        'key': ('name', 'clinic_id', 'hotel_id'),
+        'fields': ('name', 'clinic_id', 'hotel_id', 'price', 'itinerary'),
+        'json': ('itinerary',),
+        'float': ('price',),
+    },
+}
+
+
+def read_records(path, fmt):
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# CSV cells are strings: JSON columns hold JSON text and numbers need casting.
+# NDJSON values are used as they are.
+def _coerce(record, spec):
+    row = dict(record)
+    for field in spec['json']:
+        if isinstance(row.get(field), str):
+            try:
+                row[field] = json.loads(row[field])
+            except ValueError:
+                pass
+    for field in spec['float']:
+        if row.get(field) not in (None, ''):
+            row[field] = float(row[field])
+    for field in ('clinic_id', 'hotel_id'):
+        if row.get(field) not in (None, ''):
+            row[field] = int(row[field])
+    return row
+
+
+# Packages may reference their clinic and hotel by id or by
+# `clinic_name`/`clinic_location` and `hotel_name`/`hotel_location`; both are
+# resolved with one query per referenced table per batch.
+def _resolve_references(rows):
+    for model, prefix in ((Clinic, 'clinic'), (Hotel, 'hotel')):
+        id_field = prefix + '_id'
+        names = [(row.get(prefix + '_name'), row.get(prefix + '_location'))
+                 for row in rows if row.get(id_field) in (None, '')]
+        by_name = existing_keys(model, (model.name, model.location), names) if names else {}
+        known = existing_ids(model, [row[id_field] for row in rows
+                                     if row.get(id_field) not in (None, '')])
+        for row in rows:
+            if row.get(id_field) in (None, ''):
+                row[id_field] = by_name.get((row.get(prefix + '_name'), row.get(prefix + '_location')))
+            elif row[id_field] not in known:
+                row[id_field] = None
+
+
+def import_batch(kind, records):
+    spec = KINDS[kind]
+    model = spec['model']
+    rows, skipped = [], 0
+    for record in records:
+        try:
+            rows.append(_coerce(record, spec))
+        except (TypeError, ValueError):
+            skipped += 1
+    if kind == 'packages':
+        _resolve_references(rows)
+
+    candidates = {}
+    for row in rows:
+        if any(row.get(field) in (None, '') for field in spec['fields']):
+            skipped += 1
+            continue
+        key = tuple(row[field] for field in spec['key'])
+        if key in candidates:
+            skipped += 1
+            continue
+        candidates[key] = {field: row[field] for field in spec['fields']}
+
+    key_columns = [getattr(model, field) for field in spec['key']]
+    existing = existing_keys(model, key_columns, candidates)
+    skipped += len(existing)
+    new_rows = [row for key, row in candidates.items() if key not in existing]
+
+    insert_rows(model, new_rows)
+    if kind in ('clinics', 'hotels'):
+        created = existing_keys(model, key_columns, [key for key in candidates if key not in existing])
+        terms = 'specialties' if kind == 'clinics' else 'amenities'
+        values_by_id = {created[tuple(row[field] for field in spec['key'])]: row[terms]
+                        for row in new_rows}
+        if kind == 'clinics':
+            add_clinic_specialties(values_by_id)
+        else:
+            add_hotel_amenities(values_by_id)
+    db.session.commit()
+    return len(new_rows), skipped
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)['consumed']
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, consumed):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'consumed': consumed}, f)
+    os.replace(tmp, path)
+
+
+import_cli = AppGroup('catalog', help='Bulk load catalog data.')
+
+
+@import_cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Input format; defaults to the file extension.')
+@click.option('--batch-size', type=int, default=None,
+              help='Rows per transaction (default IMPORT_BATCH_SIZE).')
+@click.option('--resume', is_flag=True,
+              help='Skip the records committed by a previous, interrupted run.')
+def import_catalog(kind, path, fmt, batch_size, resume):
+    """Import clinics, hotels or packages from a CSV or NDJSON file."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    checkpoint = path + '.checkpoint'
+
+    consumed = _read_checkpoint(checkpoint) if resume else 0
+    records = read_records(path, fmt)
+    if consumed:
+        click.echo('Resuming after {} records'.format(consumed))
+        for _ in islice(records, consumed):
+            pass
+
+    inserted = skipped = 0
+    started = time.perf_counter()
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        try:
+            batch_inserted, batch_skipped = import_batch(kind, batch)
+        except Exception:
+            db.session.rollback()
+            click.echo('Import failed after {} records; rerun with --resume to continue.'.format(
+                consumed), err=True)
+            raise
+        consumed += len(batch)
+        inserted += batch_inserted
+        skipped += batch_skipped
+        _write_checkpoint(checkpoint, consumed)
+        elapsed = time.perf_counter() - started
+        click.echo('{} records read, {} inserted, {} skipped ({:,.0f} rows/s)'.format(
+            consumed, inserted, skipped, (inserted + skipped) / elapsed if elapsed else 0))
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    click.echo('Done: {} {} inserted, {} skipped.'.format(inserted, kind, skipped))
@@ -0,0 +1,203 @@
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Date, select, func, cast, inspect, or_
+from sqlalchemy.exc import DBAPIError
+from models import db, Clinic, Hotel, User, Booking, Package, ClinicSpecialty, HotelAmenity, ClinicDayLoad, Invalidation
+from utils.terms import sync_clinic_specialties, sync_hotel_amenities
+
+# Versioned schema migrations.
+#
+# Every migration runs once, in version order, inside its own transaction and
+# is recorded in the `schema_migrations` table. Migrations only ever add to the
+# schema (tables, columns, indexes) and must be safe to run against a database
+# that was created by a newer `create_all`, so they check before creating.
+
+schema_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', schema_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def _index(name):
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise LookupError(name)
+
+
+@migration(1, 'initial schema')
+def _initial_schema(connection):
+    db.metadata.create_all(connection, tables=[
+        Clinic.__table__, Hotel.__table__, User.__table__,
+        Package.__table__, Booking.__table__,
+    ])
+
+
+@migration(2, 'indexes for hot query paths')
+def _hot_path_indexes(connection):
+    for name in ('ix_booking_user_id', 'ix_booking_appointment_date',
+                 'ix_package_clinic_id', 'ix_package_hotel_id',
+                 'ix_package_name_clinic_hotel', 'ix_package_price',
+                 'ix_clinic_name_location', 'ix_hotel_name_location'):
+        _index(name).create(connection, checkfirst=True)
+
+
+@migration(3, 'clinic full-text search index')
+def _clinic_fts(connection):
+    # FTS5 only exists on SQLite; elsewhere search keeps using LIKE filters
+    if connection.dialect.name != 'sqlite':
+        return
+    options = {row[0] for row in connection.exec_driver_sql('PRAGMA compile_options')}
+    if 'ENABLE_FTS5' not in options:
+        return
+    connection.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS clinic_fts USING fts5("
+        "name, location, specialties, content='clinic', content_rowid='id')")
+    connection.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS clinic_fts_insert AFTER INSERT ON clinic BEGIN
+            INSERT INTO clinic_fts(rowid, name, location, specialties)
+            VALUES (new.id, new.name, new.location, new.specialties);
+        END""")
+    connection.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS clinic_fts_delete AFTER DELETE ON clinic BEGIN
+            INSERT INTO clinic_fts(clinic_fts, rowid, name, location, specialties)
+            VALUES ('delete', old.id, old.name, old.location, old.specialties);
+        END""")
+    connection.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS clinic_fts_update AFTER UPDATE ON clinic BEGIN
+            INSERT INTO clinic_fts(clinic_fts, rowid, name, location, specialties)
+            VALUES ('delete', old.id, old.name, old.location, old.specialties);
+            INSERT INTO clinic_fts(rowid, name, location, specialties)
+            VALUES (new.id, new.name, new.location, new.specialties);
+        END""")
+    # Index the clinics that already exist
+    connection.exec_driver_sql("INSERT INTO clinic_fts(clinic_fts) VALUES ('rebuild')")
+
+
+@migration(4, 'clinic specialty and hotel amenity indexes')
+def _term_indexes(connection):
+    db.metadata.create_all(connection, tables=[
+        ClinicSpecialty.__table__, HotelAmenity.__table__])
+    # Backfill from the JSON columns of existing rows
+    for clinic_id, specialties in connection.execute(
+            select(Clinic.id, Clinic.specialties)):
+        sync_clinic_specialties(clinic_id, specialties, connection)
+    for hotel_id, amenities in connection.execute(
+            select(Hotel.id, Hotel.amenities)):
+        sync_hotel_amenities(hotel_id, amenities, connection)
+
+
+def _has_column(connection, table, name):
+    return any(column['name'] == name for column in inspect(connection).get_columns(table))
+
+
+@migration(5, 'clinic daily capacity and per-day booking counts')
+def _clinic_capacity(connection):
+    if not _has_column(connection, 'clinic', 'daily_capacity'):
+        connection.exec_driver_sql('ALTER TABLE clinic ADD COLUMN daily_capacity INTEGER')
+    db.metadata.create_all(connection, tables=[ClinicDayLoad.__table__])
+    # Backfill the counters from existing, non-cancelled bookings
+    if connection.dialect.name == 'sqlite':
+        day = func.date(Booking.appointment_date)
+    else:
+        day = cast(Booking.appointment_date, Date)
+    rows = connection.execute(
+        select(Booking.clinic_id, day, func.count())
+        .where(or_(Booking.status.is_(None), Booking.status != 'cancelled'))
+        .group_by(Booking.clinic_id, day)).all()
+    if rows:
+        connection.execute(ClinicDayLoad.__table__.insert(), [
+            {'clinic_id': clinic_id,
+             'day': booked_day if not isinstance(booked_day, str)
+             else datetime.strptime(booked_day, '%Y-%m-%d').date(),
+             'booked': count}
+            for clinic_id, booked_day, count in rows])
+
+
+@migration(6, 'cross-process invalidation log')
+def _invalidation_log(connection):
+    db.metadata.create_all(connection, tables=[Invalidation.__table__])
+
+
+def applied_migrations(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    rows = connection.execute(select(
+        schema_migrations.c.version, schema_migrations.c.applied_at))
+    return {version: applied_at for version, applied_at in rows}
+
+
+# The schema version stamp: the highest applied migration, or 0 for a
+# database that has never been migrated. One indexed MAX() query, so startup
+# can tell an up-to-date schema apart without reflecting or creating tables.
+def schema_version(engine):
+    with engine.connect() as connection:
+        try:
+            return connection.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+        except DBAPIError:
+            return 0
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# Apply every pending migration and return the (version, name) pairs applied.
+def run_migrations(engine):
+    if schema_version(engine) >= latest_version():
+        return []
+
+    with engine.begin() as connection:
+        applied = applied_migrations(connection)
+
+    ran = []
+    for version, name, apply in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as connection:
+            apply(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()))
+        ran.append((version, name))
+    return ran
+
+
+schema_cli = AppGroup('schema', help='Inspect and apply schema migrations.')
+
+
+@schema_cli.command('status')
+def status():
+    """List every migration and whether it has been applied."""
+    with db.engine.begin() as connection:
+        applied = applied_migrations(connection)
+    for version, name, _ in MIGRATIONS:
+        if version in applied:
+            state = 'applied {}'.format(applied[version].strftime('%Y-%m-%d %H:%M:%S'))
+        else:
+            state = 'pending'
+        click.echo('{:>4}  {:<40} {}'.format(version, name, state))
+
+
+@schema_cli.command('upgrade')
+def upgrade():
+    """Apply all pending migrations."""
+    ran = run_migrations(db.engine)
+    for version, name in ran:
+        click.echo('Applied migration {}: {}'.format(version, name))
+    if not ran:
+        click.echo('Schema is up to date.')
@@ -1,10 +1,15 @@
-from flask_sqlalchemy import SQLAlchemy
+from utils.replicas import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+# Sessions route the reads of GET requests to a read replica, if configured
+db = RoutingSQLAlchemy()
 
 
 class Clinic(db.Model):
     __tablename__ = 'clinic'
+    __table_args__ = (
+        # Duplicate check in add_clinic
+        db.Index('ix_clinic_name_location', 'name', 'location'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String, nullable=False)
@@ -12,6 +17,8 @@ class Clinic(db.Model):
     specialties = db.Column(db.JSON, nullable=False)
     price_range = db.Column(db.String, nullable=False)
     ratings = db.Column(db.Float)
+    # Bookable appointments per day; None means unlimited
+    daily_capacity = db.Column(db.Integer)
 
     def to_dict(self):
         return {
@@ -21,12 +28,17 @@ class Clinic(db.Model):
             'contact_info': self.contact_info,
             'specialties': self.specialties,
             'price_range': self.price_range,
-            'ratings': self.ratings
+            'ratings': self.ratings,
+            'daily_capacity': self.daily_capacity
         }
 
 
 class Hotel(db.Model):
     __tablename__ = 'hotel'
+    __table_args__ = (
+        # Duplicate check in add_hotel
+        db.Index('ix_hotel_name_location', 'name', 'location'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String, nullable=False)
@@ -48,6 +60,11 @@ class User(db.Model):
 
 class Booking(db.Model):
     __tablename__ = 'booking'
+    __table_args__ = (
+        # get_user_bookings and the appointment_date sort key
+        db.Index('ix_booking_user_id', 'user_id'),
+        db.Index('ix_booking_appointment_date', 'appointment_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     clinic_id = db.Column(db.Integer, db.ForeignKey(
@@ -60,6 +77,14 @@ class Booking(db.Model):
 
 class Package(db.Model):
     __tablename__ = 'package'
+    __table_args__ = (
+        # Duplicate check in add_package, joins in suggest_packages and the
+        # price budget filter / sort key
+        db.Index('ix_package_name_clinic_hotel', 'name', 'clinic_id', 'hotel_id'),
+        db.Index('ix_package_clinic_id', 'clinic_id'),
+        db.Index('ix_package_hotel_id', 'hotel_id'),
+        db.Index('ix_package_price', 'price'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     clinic_id = db.Column(db.Integer, db.ForeignKey(
         'clinic.id'), nullable=False)  # ForeignKey added
@@ -68,3 +93,48 @@ class Package(db.Model):
         'hotel.id'), nullable=False)  # ForeignKey added
     price = db.Column(db.Float, nullable=False)
     itinerary = db.Column(db.JSON, nullable=False)
+
+
+# Inverted indexes over Clinic.specialties / Hotel.amenities: one row per
+# (entity, normalized term). The (term, entity_id) index turns "clinics
+# offering X AND Y" into an index range scan per term plus an intersection.
+class ClinicSpecialty(db.Model):
+    __tablename__ = 'clinic_specialty'
+    __table_args__ = (
+        db.Index('ix_clinic_specialty_specialty', 'specialty', 'clinic_id'),
+    )
+    clinic_id = db.Column(db.Integer, db.ForeignKey(
+        'clinic.id', ondelete='CASCADE'), primary_key=True)
+    specialty = db.Column(db.String(100), primary_key=True)
+
+
+class HotelAmenity(db.Model):
+    __tablename__ = 'hotel_amenity'
+    __table_args__ = (
+        db.Index('ix_hotel_amenity_amenity', 'amenity', 'hotel_id'),
+    )
+    hotel_id = db.Column(db.Integer, db.ForeignKey(
+        'hotel.id', ondelete='CASCADE'), primary_key=True)
+    amenity = db.Column(db.String(100), primary_key=True)
+
+
+# Number of active (not cancelled) bookings per clinic and day, maintained by
+# every booking write so availability never has to scan the booking table.
+class ClinicDayLoad(db.Model):
+    __tablename__ = 'clinic_day_load'
+    clinic_id = db.Column(db.Integer, db.ForeignKey(
+        'clinic.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Entity cache invalidations and token revocations, shared by every worker
+# process (see utils/invalidation.py). AUTOINCREMENT keeps ids from being
+# reused once old rows are pruned.
+class Invalidation(db.Model):
+    __tablename__ = 'invalidation'
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(200), nullable=False)
+    at = db.Column(db.Float, nullable=False)
@@ -0,0 +1,58 @@
+import sqlite3
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from models import db
+from utils.replicas import replica_router
+
+# Local read replicas for SQLite: `flask replicas sync` copies the primary
+# database file into every replica file listed in DB_READ_REPLICAS through
+# SQLite's online backup API, which takes a consistent snapshot while the app
+# keeps writing. With `--interval` it repeats forever, standing in for real
+# replication; keep READ_YOUR_WRITES_SECONDS above the interval. Other
+# databases replicate on their own and do not need this command.
+
+replica_cli = AppGroup('replicas', help='Maintain local SQLite read replicas.')
+
+
+def _sqlite_path(engine):
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        raise click.ClickException(
+            "Replica sync only copies file-based SQLite databases; "
+            "use the database's own replication otherwise.")
+    return engine.url.database
+
+
+def sync_replicas(app):
+    source_path = _sqlite_path(db.get_engine(app))
+    targets = [_sqlite_path(db.get_engine(app, bind)) for bind in replica_router.binds]
+    source = sqlite3.connect(source_path)
+    try:
+        for target_path in targets:
+            target = sqlite3.connect(target_path, timeout=30)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    return targets
+
+
+@replica_cli.command('sync')
+@click.option('--interval', type=float, default=0,
+              help='Repeat every N seconds instead of syncing once.')
+def sync_command(interval):
+    """Copy the primary SQLite database into each read replica."""
+    app = current_app._get_current_object()
+    if not replica_router.binds:
+        raise click.ClickException("No read replicas configured (DB_READ_REPLICAS).")
+    while True:
+        started = time.perf_counter()
+        targets = sync_replicas(app)
+        click.echo('Synced {} replica(s) in {:.3f}s'.format(
+            len(targets), time.perf_counter() - started))
+        if not interval:
+            break
+        time.sleep(interval)
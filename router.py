@@ -1,16 +1,18 @@
 # router.py
-from routes.booking_routes import add_booking, update_booking, delete_booking, get_all_bookings, get_user_bookings, get_booking
-from routes.clinic_routes import add_clinic, update_clinic, delete_clinic, get_all_clinics, get_clinic, search_clinics
-from routes.hotel_routes import add_hotel, get_all_hotels, get_hotel, update_hotel, delete_hotel
-from routes.package_routes import add_package, update_package, delete_package, get_all_packages, get_package, suggest_packages
-from routes.user_routes import register, login, delete_user, get_all_users, get_user, update_user_role
-from routes.root_routes import root, home
+from routes.booking_routes import add_booking, add_bookings_batch, update_booking, delete_booking, get_all_bookings, get_user_bookings, get_booking
+from routes.clinic_routes import add_clinic, add_clinics_batch, update_clinic, delete_clinic, get_all_clinics, get_clinic, search_clinics, get_clinic_availability
+from routes.hotel_routes import add_hotel, add_hotels_batch, get_all_hotels, get_hotel, update_hotel, delete_hotel
+from routes.package_routes import add_package, add_packages_batch, update_package, delete_package, get_all_packages, get_package, suggest_packages
+from routes.user_routes import register, login, logout, get_current_user, delete_user, get_all_users, get_user, update_user_role
+from routes.root_routes import root, home, cache_stats
 
 
 def add_routes(app):
 
     # Booking routes
     app.add_url_rule('/bookings', 'add_booking', add_booking, methods=['POST'])
+    app.add_url_rule('/bookings/batch', 'add_bookings_batch',
+                     add_bookings_batch, methods=['POST'])
     app.add_url_rule('/bookings/<int:booking_id>',
                      'update_booking', update_booking, methods=['PUT'])
     app.add_url_rule('/bookings/<int:booking_id>',
@@ -24,6 +26,8 @@ def add_routes(app):
 
     # Clinic routes
     app.add_url_rule('/clinics', 'add_clinic', add_clinic, methods=['POST'])
+    app.add_url_rule('/clinics/batch', 'add_clinics_batch',
+                     add_clinics_batch, methods=['POST'])
     app.add_url_rule('/clinics/<int:clinic_id>',
                      'update_clinic', update_clinic, methods=['PUT'])
     app.add_url_rule('/clinics/<int:clinic_id>', 'delete_clinic',
@@ -34,9 +38,13 @@ def add_routes(app):
                      get_clinic, methods=['GET'])
     app.add_url_rule('/clinics/search', 'search_clinics',
                      search_clinics, methods=['GET'])
+    app.add_url_rule('/clinics/<int:clinic_id>/availability', 'get_clinic_availability',
+                     get_clinic_availability, methods=['GET'])
 
     # Hotel routes
     app.add_url_rule('/hotels', 'add_hotel', add_hotel, methods=['POST'])
+    app.add_url_rule('/hotels/batch', 'add_hotels_batch',
+                     add_hotels_batch, methods=['POST'])
     app.add_url_rule('/hotels', 'get_all_hotels',
                      get_all_hotels, methods=['GET'])
     app.add_url_rule('/hotels/<int:hotel_id>', 'get_hotel',
@@ -48,6 +56,8 @@ def add_routes(app):
 
     # Package routes
     app.add_url_rule('/packages', 'add_package', add_package, methods=['POST'])
+    app.add_url_rule('/packages/batch', 'add_packages_batch',
+                     add_packages_batch, methods=['POST'])
     app.add_url_rule('/packages/<int:package_id>',
                      'update_package', update_package, methods=['PUT'])
     app.add_url_rule('/packages/<int:package_id>',
@@ -62,6 +72,9 @@ def add_routes(app):
     # User routes
     app.add_url_rule('/users', 'register', register, methods=['POST'])
     app.add_url_rule('/login', 'login', login, methods=['POST'])
+    app.add_url_rule('/logout', 'logout', logout, methods=['POST'])
+    app.add_url_rule('/users/me', 'get_current_user',
+                     get_current_user, methods=['GET'])
     app.add_url_rule('/users/<int:user_id>', 'delete_user',
                      delete_user, methods=['DELETE'])
     app.add_url_rule('/users', 'get_all_users', get_all_users, methods=['GET'])
@@ -73,3 +86,29 @@ def add_routes(app):
     # Root
     app.add_url_rule('/api', 'root', root, methods=['GET'])
     app.add_url_rule('/', 'home', home, methods=['GET'])
+    app.add_url_rule('/cache/stats', 'cache_stats',
+                     cache_stats, methods=['GET'])
+
+
+# Read routes the ASGI entry point (asgi.py) serves natively; every other
+# request goes to the Flask app registered above.
+# Imported here so the WSGI app never loads the async driver stack.
+def add_async_routes(asgi_app):
+    from routes import async_routes
+
+    asgi_app.add_url_rule('/bookings', 'get_all_bookings',
+                          async_routes.get_all_bookings)
+    asgi_app.add_url_rule('/bookings/<int:booking_id>', 'get_booking',
+                          async_routes.get_booking)
+    asgi_app.add_url_rule('/clinics', 'get_all_clinics',
+                          async_routes.get_all_clinics)
+    asgi_app.add_url_rule('/clinics/<int:clinic_id>', 'get_clinic',
+                          async_routes.get_clinic)
+    asgi_app.add_url_rule('/hotels', 'get_all_hotels',
+                          async_routes.get_all_hotels)
+    asgi_app.add_url_rule('/hotels/<int:hotel_id>', 'get_hotel',
+                          async_routes.get_hotel)
+    asgi_app.add_url_rule('/packages', 'get_all_packages',
+                          async_routes.get_all_packages)
+    asgi_app.add_url_rule('/packages/<int:package_id>', 'get_package',
+                          async_routes.get_package)
@@ -0,0 +1,89 @@
+from flask import request, jsonify
+from sqlalchemy import select
+from models import Booking, Clinic, Hotel, Package
+from routes.booking_routes import BOOKING_FIELDS
+from routes.clinic_routes import CLINIC_FIELDS
+from routes.hotel_routes import HOTEL_FIELDS
+from routes.package_routes import PACKAGE_FIELDS
+from utils.async_db import async_db
+from utils.cache import entity_cache
+from utils.etag import conditional_json
+from utils.fields import FieldsError
+from utils.pagination import keyset, page_rows, PaginationError
+from utils.streaming import stream_format
+
+# Async versions of the hot read routes, served on the event loop by asgi.py
+# through the async driver. They run in a Flask request context and answer
+# exactly like their synchronous counterparts (same bodies, status codes,
+# cursors and ETags). A view returns None for a request it does not cover,
+# such as streaming, filtered or sparse (?fields=) listings, and asgi.py hands
+# it to the WSGI app.
+
+PAGE_ARGS = {'limit', 'after', 'sort'}
+
+
+async def fetch_entity(model, fields, message, entity_id):
+    try:
+        names = fields.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+
+    async def load():
+        async with async_db.connect() as connection:
+            result = await connection.execute(
+                select(model.__table__).where(model.id == entity_id))
+            return result.first()
+
+    value, etag = await entity_cache.fetch_tagged_async(model, entity_id, fields.serialize, load)
+    if not value:
+        return jsonify({"message": message}), 404
+    return conditional_json(*fields.project(value, etag, names))
+
+
+async def fetch_page(model, fields, sort_keys, message):
+    if stream_format() or not PAGE_ARGS.issuperset(request.args):
+        return None
+    try:
+        query, columns, sort, limit = keyset(fields.select(extra=sort_keys), model, sort_keys)
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+
+    async with async_db.connect() as connection:
+        rows = (await connection.execute(query)).all()
+    rows, next_cursor = page_rows(rows, columns, sort, limit)
+    if not rows and 'after' not in request.args:
+        return jsonify({"message": message}), 404
+    serialize = fields.row_serializer()
+    return jsonify({"items": [serialize(row) for row in rows], "next": next_cursor}), 200
+
+
+async def get_all_bookings():
+    return await fetch_page(Booking, BOOKING_FIELDS, ('appointment_date',), "No bookings found.")
+
+
+async def get_booking(booking_id):
+    return await fetch_entity(Booking, BOOKING_FIELDS, "Booking not found!", booking_id)
+
+
+async def get_all_clinics():
+    return await fetch_page(Clinic, CLINIC_FIELDS, ('name',), "No clinics found.")
+
+
+async def get_clinic(clinic_id):
+    return await fetch_entity(Clinic, CLINIC_FIELDS, "Clinic not found!", clinic_id)
+
+
+async def get_all_hotels():
+    return await fetch_page(Hotel, HOTEL_FIELDS, ('name',), "No hotels found.")
+
+
+async def get_hotel(hotel_id):
+    return await fetch_entity(Hotel, HOTEL_FIELDS, "Hotel not found!", hotel_id)
+
+
+async def get_all_packages():
+    return await fetch_page(Package, PACKAGE_FIELDS, ('name', 'price'), "No packages found.")
+
+
+async def get_package(package_id):
+    return await fetch_entity(Package, PACKAGE_FIELDS, "Package not found!", package_id)
@@ -1,7 +1,42 @@
 from flask import request, jsonify
 from datetime import datetime
+from sqlalchemy import select, exists
+from sqlalchemy.exc import OperationalError
 from models import db, Booking, User, Clinic, Package
-from flasgger import swag_from
+from doc.swagger_docs import swag_from
+from utils.pagination import paginate, PaginationError, PAGE_PARAMETERS, page_schema
+from utils.streaming import stream_format, stream_rows
+from utils.cache import entity_cache
+from utils.etag import conditional_json
+from utils.fields import Fieldset, FieldsError, FIELDS_PARAMETER
+from utils.availability import occupies_slot, claim_slots, release_slots, day_load
+from utils.bulk import batch_items, invalid_item, existing_ids, insert_rows, item_error, BatchError, BATCH_RESPONSES
+
+
+# Booking fields in API responses; ?fields= selects a subset
+BOOKING_FIELDS = Fieldset({
+    "booking_id": Booking.id,
+    "user_id": Booking.user_id,
+    "clinic_id": Booking.clinic_id,
+    "package_id": Booking.package_id,
+    "status": Booking.status,
+    "appointment_date": (Booking.appointment_date, datetime.date),
+})
+serialize_booking = BOOKING_FIELDS.serialize
+
+# A user's bookings leave out the user
+USER_BOOKING_FIELDS = BOOKING_FIELDS.without("user_id")
+serialize_user_booking = USER_BOOKING_FIELDS.serialize
+
+
+# Whether the user, clinic and package all exist, in one round trip
+def references_exist(user_id, clinic_id, package_id):
+    return all(db.session.execute(select(
+        exists().where(User.id == user_id),
+        exists().where(Clinic.id == clinic_id),
+        exists().where(Package.id == package_id))).one())
+
+
 # Add a new booking
 
 
@@ -47,6 +82,12 @@ from flasgger import swag_from
         },
         '404': {
             'description': 'User, clinic, or package not found.'
+        },
+        '409': {
+            'description': 'The clinic is fully booked on the requested date.'
+        },
+        '503': {
+            'description': 'Too much write contention to claim the slot; retry after the Retry-After delay.'
         }
     }
 })
@@ -66,23 +107,125 @@ def add_booking():
         return jsonify({"message": "Invalid date format. Use YYYY-MM-DD."}), 400
 
     # Check if the user, clinic, and package exist
-    user = User.query.get(data['user_id'])
-    clinic = Clinic.query.get(data['clinic_id'])
-    package = Package.query.get(data['package_id'])
-
-    if not user or not clinic or not package:
+    if not references_exist(data['user_id'], data['clinic_id'], data['package_id']):
         return jsonify({"message": "Invalid user, clinic, or package!"}), 404
 
-    new_booking = Booking(
-        user_id=data['user_id'],
-        clinic_id=data['clinic_id'],
-        package_id=data['package_id'],
-        appointment_date=appointment_date
-    )
-    db.session.add(new_booking)
-    db.session.commit()
+    # Claim the slot before inserting; the claim fails instead of overbooking
+    # when concurrent requests race for the last one
+    try:
+        if not claim_slots(data['clinic_id'], appointment_date.date()):
+            db.session.rollback()
+            return jsonify({"message": "The clinic is fully booked on this date!"}), 409
+
+        new_booking = Booking(
+            user_id=data['user_id'],
+            clinic_id=data['clinic_id'],
+            package_id=data['package_id'],
+            appointment_date=appointment_date
+        )
+        db.session.add(new_booking)
+        db.session.commit()
+    except OperationalError:
+        # Lock wait timed out under write contention (SQLite "database is locked")
+        db.session.rollback()
+        return jsonify({"message": "Server is busy, please retry shortly."}), 503, {'Retry-After': '1'}
     return jsonify({"message": "Booking made successfully!"}), 201
 
+# Make several bookings in one transaction
+
+
+@swag_from({
+    'tags': ['Booking'],
+    'description': 'Create a batch of bookings in a single transaction and return a result per item.',
+    'parameters': [
+        {
+            'name': 'items',
+            'in': 'body',
+            'required': True,
+            'description': 'A JSON list of bookings, each with the same fields as POST /bookings.',
+            'schema': {'type': 'array', 'items': {'type': 'object'}}
+        }
+    ],
+    'responses': dict(BATCH_RESPONSES, **{
+        '503': {
+            'description': 'Too much write contention to claim the slots; retry after the Retry-After delay.'
+        }
+    })
+})
+def add_bookings_batch():
+    try:
+        items = batch_items()
+    except BatchError as e:
+        return jsonify({"message": str(e)}), 400
+
+    required_fields = ['user_id', 'clinic_id',
+                       'package_id', 'appointment_date']
+    field_types = {'user_id': int, 'clinic_id': int, 'package_id': int}
+    results = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        error = invalid_item(item, required_fields, field_types)
+        if error:
+            results[index] = item_error(index, 400, error)
+            continue
+        try:
+            valid[index] = datetime.strptime(item['appointment_date'], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            results[index] = item_error(index, 400, "Invalid date format. Use YYYY-MM-DD.")
+
+    # Resolve every referenced user, clinic and package with one query each,
+    # and the capacity and current load of every (clinic, day) with one more
+    user_ids = existing_ids(User, [items[index]['user_id'] for index in valid])
+    package_ids = existing_ids(Package, [items[index]['package_id'] for index in valid])
+    requested_clinics = {items[index]['clinic_id'] for index in valid}
+    capacities = dict(db.session.execute(
+        select(Clinic.id, Clinic.daily_capacity).where(Clinic.id.in_(requested_clinics))).all())
+    loads = {(clinic_id, day): booked for clinic_id, day, booked in db.session.execute(
+        select(day_load.c.clinic_id, day_load.c.day, day_load.c.booked).where(
+            day_load.c.clinic_id.in_(requested_clinics) &
+            day_load.c.day.in_({date.date() for date in valid.values()})))}
+    claimed = {}
+    accepted = []
+    for index, appointment_date in valid.items():
+        item = items[index]
+        if item['user_id'] not in user_ids or item['clinic_id'] not in capacities \
+                or item['package_id'] not in package_ids:
+            results[index] = item_error(index, 404, "Invalid user, clinic, or package!")
+            continue
+        slot = (item['clinic_id'], appointment_date.date())
+        capacity = capacities[item['clinic_id']]
+        if capacity is not None and loads.get(slot, 0) + claimed.get(slot, 0) >= capacity:
+            results[index] = item_error(index, 409, "The clinic is fully booked on this date!")
+            continue
+        claimed[slot] = claimed.get(slot, 0) + 1
+        accepted.append((index, slot))
+
+    # The loads read above may be stale by now: each slot's claim is a
+    # conditional update, and the items of a slot that no longer fits fail.
+    try:
+        full = {slot for slot, count in claimed.items() if not claim_slots(*slot, count)}
+        rows = []
+        for index, slot in accepted:
+            if slot in full:
+                results[index] = item_error(index, 409, "The clinic is fully booked on this date!")
+                continue
+            item = items[index]
+            rows.append({
+                'user_id': item['user_id'],
+                'clinic_id': item['clinic_id'],
+                'package_id': item['package_id'],
+                'status': 'pending',
+                'appointment_date': valid[index]
+            })
+            results[index] = {"index": index, "status": 201, "message": "Booking made successfully!"}
+        insert_rows(Booking, rows)
+        db.session.commit()
+    except OperationalError:
+        # Lock wait timed out under write contention (SQLite "database is locked")
+        db.session.rollback()
+        return jsonify({"message": "Server is busy, please retry shortly."}), 503, {'Retry-After': '1'}
+    return jsonify({"created": len(rows), "results": results}), 200
+
 # Update an existing booking
 
 
@@ -121,6 +264,12 @@ def add_booking():
         },
         '404': {
             'description': 'Booking not found.'
+        },
+        '409': {
+            'description': 'The clinic is fully booked on the new date.'
+        },
+        '503': {
+            'description': 'Too much write contention to claim the slot; retry after the Retry-After delay.'
         }
     }
 })
@@ -133,6 +282,8 @@ def update_booking(booking_id):
     if not any(key in data for key in ['status', 'appointment_date']):
         return jsonify({"message": "Invalid input! 'status' or 'appointment_date' is required."}), 400
 
+    old_slot = (occupies_slot(booking.status), booking.appointment_date.date())
+
     if 'status' in data:
         booking.status = data['status']
 
@@ -143,7 +294,22 @@ def update_booking(booking_id):
         except ValueError:
             return jsonify({"message": "Invalid date format. Use YYYY-MM-DD."}), 400
 
-    db.session.commit()
+    # Move the booking's slot if it was rescheduled, cancelled or reinstated
+    new_slot = (occupies_slot(booking.status), booking.appointment_date.date())
+    try:
+        if new_slot != old_slot:
+            if old_slot[0]:
+                release_slots(booking.clinic_id, old_slot[1])
+            if new_slot[0] and not claim_slots(booking.clinic_id, new_slot[1]):
+                db.session.rollback()
+                return jsonify({"message": "The clinic is fully booked on this date!"}), 409
+
+        db.session.commit()
+    except OperationalError:
+        # Lock wait timed out under write contention (SQLite "database is locked")
+        db.session.rollback()
+        return jsonify({"message": "Server is busy, please retry shortly."}), 503, {'Retry-After': '1'}
+    entity_cache.invalidate(Booking, booking_id)
     return jsonify({"message": "Booking updated successfully!"}), 200
 
 # Delete a booking
@@ -175,8 +341,11 @@ def delete_booking(booking_id):
     if not booking:
         return jsonify({"message": "Booking not found!"}), 404
 
+    if occupies_slot(booking.status):
+        release_slots(booking.clinic_id, booking.appointment_date.date())
     db.session.delete(booking)
     db.session.commit()
+    entity_cache.invalidate(Booking, booking_id)
     return jsonify({"message": "Booking deleted successfully!"}), 200
 
 # Get all bookings
@@ -185,23 +354,21 @@ def delete_booking(booking_id):
 @swag_from({
     'tags': ['Booking'],
     'description': 'Retrieve all bookings.',
+    'parameters': PAGE_PARAMETERS + [FIELDS_PARAMETER],
     'responses': {
         '200': {
             'description': 'List of all bookings.',
-            'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object',
-                    'properties': {
-                        'booking_id': {'type': 'integer'},
-                        'user_id': {'type': 'integer'},
-                        'clinic_id': {'type': 'integer'},
-                        'package_id': {'type': 'integer'},
-                        'status': {'type': 'string'},
-                        'appointment_date': {'type': 'string'}
-                    }
+            'schema': page_schema({
+                'type': 'object',
+                'properties': {
+                    'booking_id': {'type': 'integer'},
+                    'user_id': {'type': 'integer'},
+                    'clinic_id': {'type': 'integer'},
+                    'package_id': {'type': 'integer'},
+                    'status': {'type': 'string'},
+                    'appointment_date': {'type': 'string'}
                 }
-            }
+            })
         },
         '404': {
             'description': 'No bookings found.'
@@ -209,18 +376,27 @@ def delete_booking(booking_id):
     }
 })
 def get_all_bookings():
-    bookings = Booking.query.all()
-    if not bookings:
+    try:
+        fields = BOOKING_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    query = BOOKING_FIELDS.select(fields, extra=('appointment_date',))
+    serialize = BOOKING_FIELDS.row_serializer(fields)
+
+    fmt = stream_format()
+    if fmt:
+        return stream_rows(query, Booking, serialize, fmt)
+
+    try:
+        bookings, next_cursor = paginate(
+            query, Booking, sort_keys=('appointment_date',))
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+    if not bookings and 'after' not in request.args:
         return jsonify({"message": "No bookings found."}), 404
 
-    return jsonify([{
-        "booking_id": booking.id,
-        "user_id": booking.user_id,
-        "clinic_id": booking.clinic_id,
-        "package_id": booking.package_id,
-        "status": booking.status,
-        "appointment_date": booking.appointment_date.strftime('%Y-%m-%d')
-    } for booking in bookings]), 200
+    return jsonify({"items": [serialize(booking) for booking in bookings],
+                    "next": next_cursor}), 200
 
 # Get all bookings for a user
 
@@ -236,23 +412,20 @@ def get_all_bookings():
             'required': True,
             'description': 'The user ID.'
         }
-    ],
+    ] + PAGE_PARAMETERS + [FIELDS_PARAMETER],
     'responses': {
         '200': {
             'description': 'List of bookings for the user.',
-            'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object',
-                    'properties': {
-                        'booking_id': {'type': 'integer'},
-                        'clinic_id': {'type': 'integer'},
-                        'package_id': {'type': 'integer'},
-                        'status': {'type': 'string'},
-                        'appointment_date': {'type': 'string'}
-                    }
+            'schema': page_schema({
+                'type': 'object',
+                'properties': {
+                    'booking_id': {'type': 'integer'},
+                    'clinic_id': {'type': 'integer'},
+                    'package_id': {'type': 'integer'},
+                    'status': {'type': 'string'},
+                    'appointment_date': {'type': 'string'}
                 }
-            }
+            })
         },
         '404': {
             'description': 'No bookings found for this user.'
@@ -260,17 +433,29 @@ def get_all_bookings():
     }
 })
 def get_user_bookings(user_id):
-    bookings = Booking.query.filter_by(user_id=user_id).all()
-    if not bookings:
+    try:
+        fields = USER_BOOKING_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    query = USER_BOOKING_FIELDS.select(fields, extra=('appointment_date',)) \
+        .where(Booking.user_id == user_id)
+    serialize = USER_BOOKING_FIELDS.row_serializer(fields)
+
+    fmt = stream_format()
+    if fmt:
+        return stream_rows(query, Booking, serialize, fmt)
+
+    try:
+        bookings, next_cursor = paginate(
+            query, Booking,
+            sort_keys=('appointment_date',))
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+    if not bookings and 'after' not in request.args:
         return jsonify({"message": "No bookings found for this user."}), 404
 
-    return jsonify([{
-        "booking_id": booking.id,
-        "clinic_id": booking.clinic_id,
-        "package_id": booking.package_id,
-        "status": booking.status,
-        "appointment_date": booking.appointment_date.strftime('%Y-%m-%d')
-    } for booking in bookings]), 200
+    return jsonify({"items": [serialize(booking) for booking in bookings],
+                    "next": next_cursor}), 200
 
 # Get a specific booking by ID
 
@@ -285,7 +470,8 @@ def get_user_bookings(user_id):
             'type': 'integer',
             'required': True,
             'description': 'The booking ID.'
-        }
+        },
+        FIELDS_PARAMETER
     ],
     'responses': {
         '200': {
@@ -308,15 +494,12 @@ def get_user_bookings(user_id):
     }
 })
 def get_booking(booking_id):
-    booking = Booking.query.get(booking_id)
+    try:
+        fields = BOOKING_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    booking, etag = entity_cache.fetch_tagged(Booking, booking_id, serialize_booking)
     if not booking:
         return jsonify({"message": "Booking not found!"}), 404
 
-    return jsonify({
-        "booking_id": booking.id,
-        "user_id": booking.user_id,
-        "clinic_id": booking.clinic_id,
-        "package_id": booking.package_id,
-        "status": booking.status,
-        "appointment_date": booking.appointment_date.strftime('%Y-%m-%d')
-    }), 200
+    return conditional_json(*BOOKING_FIELDS.project(booking, etag, fields))
@@ -1,6 +1,45 @@
-from flask import request, jsonify
+from datetime import datetime, date, timedelta
+from flask import request, jsonify, current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from models import db, Clinic
-from flasgger import swag_from
+from doc.swagger_docs import swag_from
+from utils.pagination import paginate, page_limit, PaginationError, PAGE_PARAMETERS, page_schema
+from utils.streaming import stream_format, stream_rows
+from utils.cache import entity_cache
+from utils.etag import conditional_json
+from utils.fields import Fieldset, FieldsError, FIELDS_PARAMETER
+from utils.search import clinic_fts_enabled, clinic_match, filter_matching, ranked_matches
+from utils.terms import sync_clinic_specialties, add_clinic_specialties, clinics_offering, term_args
+from utils.suggestions import suggestion_engine
+from utils.availability import booked_between
+from utils.bulk import batch_items, invalid_item, existing_keys, insert_rows, item_error, BatchError, BATCH_RESPONSES, NUMBER, optional_count
+
+
+# Clinic fields in API responses; ?fields= selects a subset
+CLINIC_FIELDS = Fieldset({
+    "clinic_id": Clinic.id,
+    "name": Clinic.name,
+    "location": Clinic.location,
+    "contact_info": Clinic.contact_info,
+    "specialties": Clinic.specialties,
+    "price_range": Clinic.price_range,
+    "ratings": Clinic.ratings,
+    "daily_capacity": Clinic.daily_capacity,
+})
+serialize_clinic = CLINIC_FIELDS.serialize
+
+# Search results keep the shape of Clinic.to_dict
+CLINIC_SEARCH_FIELDS = Fieldset({
+    "id": Clinic.id,
+    "name": Clinic.name,
+    "location": Clinic.location,
+    "contact_info": Clinic.contact_info,
+    "specialties": Clinic.specialties,
+    "price_range": Clinic.price_range,
+    "ratings": Clinic.ratings,
+    "daily_capacity": Clinic.daily_capacity,
+})
 
 # Add a new clinic
 
@@ -50,6 +89,13 @@ from flasgger import swag_from
             'type': 'number',
             'required': True,
             'description': 'Ratings for the clinic (1 to 5).'
+        },
+        {
+            'name': 'daily_capacity',
+            'in': 'json',
+            'type': 'integer',
+            'required': False,
+            'description': 'Appointments the clinic can take per day; omit or null for unlimited.'
         }
     ],
     'responses': {
@@ -71,6 +117,8 @@ def add_clinic():
 
     if not all(field in data for field in required_fields):
         return jsonify({"message": "Missing required fields!"}), 400
+    if not optional_count(data.get('daily_capacity')):
+        return jsonify({"message": "daily_capacity must be a non-negative integer or null!"}), 400
 
     # Check for duplicates (e.g., by name and location)
     existing_clinic = Clinic.query.filter_by(
@@ -85,14 +133,90 @@ def add_clinic():
         contact_info=data['contact_info'],
         specialties=data['specialties'],
         price_range=data['price_range'],
-        ratings=data['ratings']
+        ratings=data['ratings'],
+        daily_capacity=data.get('daily_capacity')
     )
 
     # Add to database
     db.session.add(new_clinic)
+    db.session.flush()
+    sync_clinic_specialties(new_clinic.id, new_clinic.specialties)
     db.session.commit()
+    suggestion_engine.invalidate()
     return jsonify({"message": "Clinic added successfully!"}), 201
 
+# Add several clinics in one transaction
+
+
+@swag_from({
+    'tags': ['Clinic'],
+    'description': 'Add a batch of clinics in a single transaction and return a result per item.',
+    'parameters': [
+        {
+            'name': 'items',
+            'in': 'body',
+            'required': True,
+            'description': 'A JSON list of clinics, each with the same fields as POST /clinics.',
+            'schema': {'type': 'array', 'items': {'type': 'object'}}
+        }
+    ],
+    'responses': BATCH_RESPONSES
+})
+def add_clinics_batch():
+    try:
+        items = batch_items()
+    except BatchError as e:
+        return jsonify({"message": str(e)}), 400
+
+    required_fields = ['name', 'location', 'contact_info',
+                       'specialties', 'price_range', 'ratings']
+    field_types = {'name': str, 'location': str, 'specialties': (list, str),
+                   'price_range': str, 'ratings': NUMBER, 'daily_capacity': optional_count}
+    results = [None] * len(items)
+    candidates = {}
+    for index, item in enumerate(items):
+        error = invalid_item(item, required_fields, field_types)
+        if error:
+            results[index] = item_error(index, 400, error)
+        elif (item['name'], item['location']) in candidates:
+            results[index] = item_error(
+                index, 409, "Clinic with the same name and location appears twice in this batch!")
+        else:
+            candidates[(item['name'], item['location'])] = index
+
+    # One query for every duplicate check
+    key_columns = (Clinic.name, Clinic.location)
+    existing = existing_keys(Clinic, key_columns, candidates)
+    rows = []
+    for key, index in candidates.items():
+        if key in existing:
+            results[index] = item_error(
+                index, 409, "Clinic with the same name and location already exists!")
+            continue
+        item = items[index]
+        rows.append({
+            'name': item['name'],
+            'location': item['location'],
+            'contact_info': item['contact_info'],
+            'specialties': item['specialties'],
+            'price_range': item['price_range'],
+            'ratings': item['ratings'],
+            'daily_capacity': item.get('daily_capacity')
+        })
+
+    insert_rows(Clinic, rows)
+    created = existing_keys(Clinic, key_columns, [(row['name'], row['location']) for row in rows])
+    add_clinic_specialties({created[(row['name'], row['location'])]: row['specialties'] for row in rows})
+    db.session.commit()
+    if rows:
+        suggestion_engine.invalidate()
+
+    for row in rows:
+        key = (row['name'], row['location'])
+        results[candidates[key]] = {"index": candidates[key], "status": 201,
+                                    "message": "Clinic added successfully!", "clinic_id": created[key]}
+    return jsonify({"created": len(rows), "results": results}), 200
+
 # Update a clinic's details
 
 
@@ -148,12 +272,22 @@ def add_clinic():
             'type': 'number',
             'required': False,
             'description': 'Ratings for the clinic (1 to 5).'
+        },
+        {
+            'name': 'daily_capacity',
+            'in': 'json',
+            'type': 'integer',
+            'required': False,
+            'description': 'Appointments the clinic can take per day; omit or null for unlimited.'
         }
     ],
     'responses': {
         '200': {
             'description': 'Clinic details updated successfully.'
         },
+        '400': {
+            'description': 'daily_capacity is not a non-negative integer or null.'
+        },
         '404': {
             'description': 'Clinic not found.'
         }
@@ -165,6 +299,9 @@ def update_clinic(clinic_id):
         return jsonify({"message": "Clinic not found!"}), 404
 
     data = request.get_json()
+    if not optional_count(data.get('daily_capacity')):
+        return jsonify({"message": "daily_capacity must be a non-negative integer or null!"}), 400
+
     if 'name' in data:
         clinic.name = data['name']
     if 'location' in data:
@@ -173,12 +310,17 @@ def update_clinic(clinic_id):
         clinic.contact_info = data['contact_info']
     if 'specialties' in data:
         clinic.specialties = data['specialties']
+        sync_clinic_specialties(clinic.id, clinic.specialties)
     if 'price_range' in data:
         clinic.price_range = data['price_range']
     if 'ratings' in data:
         clinic.ratings = data['ratings']
+    if 'daily_capacity' in data:
+        clinic.daily_capacity = data['daily_capacity']
 
     db.session.commit()
+    entity_cache.invalidate(Clinic, clinic_id)
+    suggestion_engine.invalidate()
     return jsonify({"message": "Clinic details updated successfully!"}), 200
 
 # Delete a clinic
@@ -202,6 +344,9 @@ def update_clinic(clinic_id):
         },
         '404': {
             'description': 'Clinic not found.'
+        },
+        '409': {
+            'description': 'Clinic still has packages or bookings.'
         }
     }
 })
@@ -210,8 +355,15 @@ def delete_clinic(clinic_id):
     if not clinic:
         return jsonify({"message": "Clinic not found!"}), 404
 
+    sync_clinic_specialties(clinic.id, None)
     db.session.delete(clinic)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "Clinic still has packages or bookings; delete them first."}), 409
+    entity_cache.invalidate(Clinic, clinic_id)
+    suggestion_engine.invalidate()
     return jsonify({"message": "Clinic deleted successfully!"}), 200
 
 # Get all clinics
@@ -220,24 +372,22 @@ def delete_clinic(clinic_id):
 @swag_from({
     'tags': ['Clinic'],
     'description': 'Retrieve a list of all clinics.',
+    'parameters': PAGE_PARAMETERS + [FIELDS_PARAMETER],
     'responses': {
         '200': {
             'description': 'List of all clinics.',
-            'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object',
-                    'properties': {
-                        'clinic_id': {'type': 'integer'},
-                        'name': {'type': 'string'},
-                        'location': {'type': 'string'},
-                        'contact_info': {'type': 'string'},
-                        'specialties': {'type': 'string'},
-                        'price_range': {'type': 'string'},
-                        'ratings': {'type': 'number'}
-                    }
+            'schema': page_schema({
+                'type': 'object',
+                'properties': {
+                    'clinic_id': {'type': 'integer'},
+                    'name': {'type': 'string'},
+                    'location': {'type': 'string'},
+                    'contact_info': {'type': 'string'},
+                    'specialties': {'type': 'string'},
+                    'price_range': {'type': 'string'},
+                    'ratings': {'type': 'number'}
                 }
-            }
+            })
         },
         '404': {
             'description': 'No clinics found.'
@@ -245,19 +395,27 @@ def delete_clinic(clinic_id):
     }
 })
 def get_all_clinics():
-    clinics = Clinic.query.all()
-    if not clinics:
+    try:
+        fields = CLINIC_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    query = CLINIC_FIELDS.select(fields, extra=('name',))
+    serialize = CLINIC_FIELDS.row_serializer(fields)
+
+    fmt = stream_format()
+    if fmt:
+        return stream_rows(query, Clinic, serialize, fmt)
+
+    try:
+        clinics, next_cursor = paginate(
+            query, Clinic, sort_keys=('name',))
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+    if not clinics and 'after' not in request.args:
         return jsonify({"message": "No clinics found."}), 404
 
-    return jsonify([{
-        "clinic_id": clinic.id,
-        "name": clinic.name,
-        "location": clinic.location,
-        "contact_info": clinic.contact_info,
-        "specialties": clinic.specialties,
-        "price_range": clinic.price_range,
-        "ratings": clinic.ratings
-    } for clinic in clinics]), 200
+    return jsonify({"items": [serialize(clinic) for clinic in clinics],
+                    "next": next_cursor}), 200
 
 # Get a specific clinic by ID
 
@@ -272,7 +430,8 @@ def get_all_clinics():
             'type': 'integer',
             'required': True,
             'description': 'The clinic ID to retrieve.'
-        }
+        },
+        FIELDS_PARAMETER
     ],
     'responses': {
         '200': {
@@ -296,18 +455,99 @@ def get_all_clinics():
     }
 })
 def get_clinic(clinic_id):
-    clinic = Clinic.query.get(clinic_id)
+    try:
+        fields = CLINIC_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    clinic, etag = entity_cache.fetch_tagged(Clinic, clinic_id, serialize_clinic)
     if not clinic:
         return jsonify({"message": "Clinic not found!"}), 404
 
+    return conditional_json(*CLINIC_FIELDS.project(clinic, etag, fields))
+
+# Daily availability of a clinic
+
+
+@swag_from({
+    'tags': ['Clinic'],
+    'description': 'Booked and free appointment counts per day for a clinic.',
+    'parameters': [
+        {
+            'name': 'clinic_id',
+            'in': 'path',
+            'type': 'integer',
+            'required': True,
+            'description': 'The clinic ID.'
+        },
+        {
+            'name': 'from',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'First day (YYYY-MM-DD), default today.'
+        },
+        {
+            'name': 'to',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Last day (YYYY-MM-DD), default 30 days after "from". At most AVAILABILITY_MAX_DAYS days.'
+        }
+    ],
+    'responses': {
+        '200': {
+            'description': 'Availability per day.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'clinic_id': {'type': 'integer'},
+                    'daily_capacity': {'type': 'integer'},
+                    'days': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'date': {'type': 'string'},
+                                'booked': {'type': 'integer'},
+                                'available': {'type': 'integer'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        '400': {
+            'description': 'Invalid date range.'
+        },
+        '404': {
+            'description': 'Clinic not found.'
+        }
+    }
+})
+def get_clinic_availability(clinic_id):
+    clinic = entity_cache.fetch(Clinic, clinic_id, serialize_clinic)
+    if not clinic:
+        return jsonify({"message": "Clinic not found!"}), 404
+
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() \
+            if 'from' in request.args else date.today()
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() \
+            if 'to' in request.args else start + timedelta(days=30)
+    except ValueError:
+        return jsonify({"message": "Invalid date format. Use YYYY-MM-DD."}), 400
+    if end < start or (end - start).days >= current_app.config['AVAILABILITY_MAX_DAYS']:
+        return jsonify({"message": "Invalid date range!"}), 400
+
+    capacity = clinic['daily_capacity']
     return jsonify({
-        "clinic_id": clinic.id,
-        "name": clinic.name,
-        "location": clinic.location,
-        "contact_info": clinic.contact_info,
-        "specialties": clinic.specialties,
-        "price_range": clinic.price_range,
-        "ratings": clinic.ratings
+        "clinic_id": clinic_id,
+        "daily_capacity": capacity,
+        "days": [{
+            "date": day.isoformat(),
+            "booked": booked,
+            "available": max(capacity - booked, 0) if capacity is not None else None
+        } for day, booked in booked_between(clinic_id, start, end)]
     }), 200
 
 # Search clinics by specialties, price range, location, or ratings
@@ -315,8 +555,22 @@ def get_clinic(clinic_id):
 
 @swag_from({
     'tags': ['Clinic'],
-    'description': 'Search for clinics based on specialties, price range, location, or ratings.',
+    'description': 'Search for clinics based on specialties, price range, location, or ratings. Text filters use prefix matching and, without an explicit sort, results are ranked by relevance.',
     'parameters': [
+        {
+            'name': 'q',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Free text matched against name, location and specialties.'
+        },
+        {
+            'name': 'name',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Clinic name to filter clinics by.'
+        },
         {
             'name': 'specialties',
             'in': 'query',
@@ -324,6 +578,13 @@ def get_clinic(clinic_id):
             'required': False,
             'description': 'Specialties to filter clinics by.'
         },
+        {
+            'name': 'specialty',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Exact specialty the clinic must offer; repeat or comma-separate to require several (e.g. rhinoplasty,botox).'
+        },
         {
             'name': 'price_range',
             'in': 'query',
@@ -345,41 +606,78 @@ def get_clinic(clinic_id):
             'required': False,
             'description': 'Ratings to filter clinics by.'
         }
-    ],
+    ] + PAGE_PARAMETERS + [FIELDS_PARAMETER],
     'responses': {
         '200': {
             'description': 'List of clinics matching search criteria.',
-            'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object',
-                    'properties': {
-                        'clinic_id': {'type': 'integer'},
-                        'name': {'type': 'string'},
-                        'location': {'type': 'string'},
-                        'contact_info': {'type': 'string'},
-                        'specialties': {'type': 'string'},
-                        'price_range': {'type': 'string'},
-                        'ratings': {'type': 'number'}
-                    }
+            'schema': page_schema({
+                'type': 'object',
+                'properties': {
+                    'clinic_id': {'type': 'integer'},
+                    'name': {'type': 'string'},
+                    'location': {'type': 'string'},
+                    'contact_info': {'type': 'string'},
+                    'specialties': {'type': 'string'},
+                    'price_range': {'type': 'string'},
+                    'ratings': {'type': 'number'}
                 }
-            }
+            })
         }
     }
 })
 def search_clinics():
     params = request.args
-    query = Clinic.query
+    try:
+        fields = CLINIC_SEARCH_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    query = CLINIC_SEARCH_FIELDS.select(fields, extra=('name',))
+    serialize = CLINIC_SEARCH_FIELDS.row_serializer(fields)
 
-    if 'specialties' in params:
-        query = query.filter(
-            Clinic.specialties.contains(params['specialties']))
+    # Text filters go through the FTS5 index when it exists
+    match = clinic_match(params) if clinic_fts_enabled() else None
+    if match is None:
+        if 'q' in params:
+            query = query.filter(or_(
+                Clinic.name.contains(params['q']),
+                Clinic.location.contains(params['q']),
+                Clinic.specialties.contains(params['q'])))
+        if 'name' in params:
+            query = query.filter(Clinic.name.contains(params['name']))
+        if 'specialties' in params:
+            query = query.filter(
+                Clinic.specialties.contains(params['specialties']))
+        if 'location' in params:
+            query = query.filter(Clinic.location.contains(params['location']))
+    # Exact specialties (all must be offered) use the clinic_specialty index
+    specialties = term_args(params, 'specialty')
+    if specialties:
+        query = query.filter(Clinic.id.in_(clinics_offering(specialties)))
     if 'price_range' in params:
-        query = query.filter_by(price_range=params['price_range'])
-    if 'location' in params:
-        query = query.filter(Clinic.location.contains(params['location']))
+        query = query.filter(Clinic.price_range == params['price_range'])
     if 'ratings' in params:
         query = query.filter(Clinic.ratings >= float(params['ratings']))
 
-    clinics = query.all()
-    return jsonify([clinic.to_dict() for clinic in clinics]), 200
+    fmt = stream_format()
+    if fmt:
+        if match is not None:
+            query = filter_matching(query, match)
+        return stream_rows(query, Clinic, serialize, fmt)
+
+    # Full-text searches return the best `limit` matches by BM25 rank unless
+    # the client asked for an explicit sort order
+    if match is not None and 'sort' not in params and 'after' not in params:
+        try:
+            limit = page_limit()
+        except PaginationError as e:
+            return jsonify({"message": str(e)}), 400
+        clinics = db.session.execute(ranked_matches(query, match, limit)).all()
+        return jsonify({"items": [serialize(clinic) for clinic in clinics], "next": None}), 200
+
+    if match is not None:
+        query = filter_matching(query, match)
+    try:
+        clinics, next_cursor = paginate(query, Clinic, sort_keys=('name',))
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"items": [serialize(clinic) for clinic in clinics], "next": next_cursor}), 200
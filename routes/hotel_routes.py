@@ -1,6 +1,27 @@
 from flask import request, jsonify
+from sqlalchemy.exc import IntegrityError
 from models import db, Hotel, Package
-from flasgger import swag_from
+from doc.swagger_docs import swag_from
+from utils.pagination import paginate, PaginationError, PAGE_PARAMETERS, page_schema
+from utils.streaming import stream_format, stream_rows
+from utils.cache import entity_cache
+from utils.etag import conditional_json
+from utils.fields import Fieldset, FieldsError, FIELDS_PARAMETER
+from utils.terms import sync_hotel_amenities, add_hotel_amenities, hotels_providing, term_args
+from utils.bulk import batch_items, invalid_item, existing_keys, insert_rows, item_error, BatchError, BATCH_RESPONSES, NUMBER
+
+
+# Hotel fields in API responses; ?fields= selects a subset
+HOTEL_FIELDS = Fieldset({
+    "hotel_id": Hotel.id,
+    "name": Hotel.name,
+    "location": Hotel.location,
+    "amenities": Hotel.amenities,
+    "price_range": Hotel.price_range,
+    "ratings": Hotel.ratings,
+})
+serialize_hotel = HOTEL_FIELDS.serialize
+
 
 # Add a new hotel
 @swag_from({
@@ -80,31 +101,106 @@ def add_hotel():
 
     # Add to database
     db.session.add(new_hotel)
+    db.session.flush()
+    sync_hotel_amenities(new_hotel.id, new_hotel.amenities)
     db.session.commit()
     return jsonify({"message": "Hotel added successfully!"}), 201
 
+# Add several hotels in one transaction
+
+@swag_from({
+    'tags': ['Hotel'],
+    'description': 'Add a batch of hotels in a single transaction and return a result per item.',
+    'parameters': [
+        {
+            'name': 'items',
+            'in': 'body',
+            'required': True,
+            'description': 'A JSON list of hotels, each with the same fields as POST /hotels.',
+            'schema': {'type': 'array', 'items': {'type': 'object'}}
+        }
+    ],
+    'responses': BATCH_RESPONSES
+})
+def add_hotels_batch():
+    try:
+        items = batch_items()
+    except BatchError as e:
+        return jsonify({"message": str(e)}), 400
+
+    required_fields = ['name', 'location',
+                       'amenities', 'price_range', 'ratings']
+    field_types = {'name': str, 'location': str, 'amenities': (list, str),
+                   'price_range': str, 'ratings': NUMBER}
+    results = [None] * len(items)
+    candidates = {}
+    for index, item in enumerate(items):
+        error = invalid_item(item, required_fields, field_types)
+        if error:
+            results[index] = item_error(index, 400, error)
+        elif (item['name'], item['location']) in candidates:
+            results[index] = item_error(
+                index, 409, "Hotel with the same name and location appears twice in this batch!")
+        else:
+            candidates[(item['name'], item['location'])] = index
+
+    # One query for every duplicate check
+    key_columns = (Hotel.name, Hotel.location)
+    existing = existing_keys(Hotel, key_columns, candidates)
+    rows = []
+    for key, index in candidates.items():
+        if key in existing:
+            results[index] = item_error(
+                index, 409, "Hotel with the same name and location already exists!")
+            continue
+        item = items[index]
+        rows.append({
+            'name': item['name'],
+            'location': item['location'],
+            'amenities': item['amenities'],
+            'price_range': item['price_range'],
+            'ratings': item['ratings']
+        })
+
+    insert_rows(Hotel, rows)
+    created = existing_keys(Hotel, key_columns, [(row['name'], row['location']) for row in rows])
+    add_hotel_amenities({created[(row['name'], row['location'])]: row['amenities'] for row in rows})
+    db.session.commit()
+
+    for row in rows:
+        key = (row['name'], row['location'])
+        results[candidates[key]] = {"index": candidates[key], "status": 201,
+                                    "message": "Hotel added successfully!", "hotel_id": created[key]}
+    return jsonify({"created": len(rows), "results": results}), 200
+
 # Get all hotels
 
 @swag_from({
     'tags': ['Hotel'],
     'description': 'Retrieve a list of all hotels.',
+    'parameters': [
+        {
+            'name': 'amenity',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Amenity the hotel must provide; repeat or comma-separate to require several.'
+        }
+    ] + PAGE_PARAMETERS + [FIELDS_PARAMETER],
     'responses': {
         '200': {
             'description': 'List of all hotels.',
-            'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object',
-                    'properties': {
-                        'hotel_id': {'type': 'integer'},
-                        'name': {'type': 'string'},
-                        'location': {'type': 'string'},
-                        'amenities': {'type': 'string'},
-                        'price_range': {'type': 'string'},
-                        'ratings': {'type': 'number'}
-                    }
+            'schema': page_schema({
+                'type': 'object',
+                'properties': {
+                    'hotel_id': {'type': 'integer'},
+                    'name': {'type': 'string'},
+                    'location': {'type': 'string'},
+                    'amenities': {'type': 'string'},
+                    'price_range': {'type': 'string'},
+                    'ratings': {'type': 'number'}
                 }
-            }
+            })
         },
         '404': {
             'description': 'No hotels found.'
@@ -112,18 +208,31 @@ def add_hotel():
     }
 })
 def get_all_hotels():
-    hotels = Hotel.query.all()
-    if not hotels:
+    try:
+        fields = HOTEL_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    query = HOTEL_FIELDS.select(fields, extra=('name',))
+    serialize = HOTEL_FIELDS.row_serializer(fields)
+
+    # Exact amenities (all must be provided) use the hotel_amenity index
+    amenities = term_args(request.args, 'amenity')
+    if amenities:
+        query = query.filter(Hotel.id.in_(hotels_providing(amenities)))
+
+    fmt = stream_format()
+    if fmt:
+        return stream_rows(query, Hotel, serialize, fmt)
+
+    try:
+        hotels, next_cursor = paginate(query, Hotel, sort_keys=('name',))
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+    if not hotels and 'after' not in request.args:
         return jsonify({"message": "No hotels found."}), 404
 
-    return jsonify([{
-        "hotel_id": hotel.id,
-        "name": hotel.name,
-        "location": hotel.location,
-        "amenities": hotel.amenities,
-        "price_range": hotel.price_range,
-        "ratings": hotel.ratings
-    } for hotel in hotels]), 200
+    return jsonify({"items": [serialize(hotel) for hotel in hotels],
+                    "next": next_cursor}), 200
 
 # Get a specific hotel by ID
 
@@ -137,7 +246,8 @@ def get_all_hotels():
             'type': 'integer',
             'required': True,
             'description': 'The hotel ID to retrieve.'
-        }
+        },
+        FIELDS_PARAMETER
     ],
     'responses': {
         '200': {
@@ -161,18 +271,15 @@ def get_all_hotels():
 })
 
 def get_hotel(hotel_id):
-    hotel = Hotel.query.get(hotel_id)
+    try:
+        fields = HOTEL_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    hotel, etag = entity_cache.fetch_tagged(Hotel, hotel_id, serialize_hotel)
     if not hotel:
         return jsonify({"message": "Hotel not found!"}), 404
 
-    return jsonify({
-        "hotel_id": hotel.id,
-        "name": hotel.name,
-        "location": hotel.location,
-        "amenities": hotel.amenities,
-        "price_range": hotel.price_range,
-        "ratings": hotel.ratings
-    }), 200
+    return conditional_json(*HOTEL_FIELDS.project(hotel, etag, fields))
 
 # Update a hotel
 
@@ -246,12 +353,14 @@ def update_hotel(hotel_id):
         hotel.location = data['location']
     if 'amenities' in data:
         hotel.amenities = data['amenities']
+        sync_hotel_amenities(hotel.id, hotel.amenities)
     if 'price_range' in data:
         hotel.price_range = data['price_range']
     if 'ratings' in data:
         hotel.ratings = data['ratings']
 
     db.session.commit()
+    entity_cache.invalidate(Hotel, hotel_id)
     return jsonify({"message": "Hotel details updated successfully!"}), 200
 
 # Delete a hotel
@@ -275,6 +384,9 @@ def update_hotel(hotel_id):
         },
         '404': {
             'description': 'Hotel not found.'
+        },
+        '409': {
+            'description': 'Hotel still has packages.'
         }
     }
 })
@@ -284,6 +396,12 @@ def delete_hotel(hotel_id):
     if not hotel:
         return jsonify({"message": "Hotel not found!"}), 404
 
+    sync_hotel_amenities(hotel.id, None)
     db.session.delete(hotel)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "Hotel still has packages; delete them first."}), 409
+    entity_cache.invalidate(Hotel, hotel_id)
     return jsonify({"message": "Hotel deleted successfully!"}), 200
@@ -1,6 +1,35 @@
-from flask import request, jsonify
-from models import db, Package, Clinic
-from flasgger import swag_from
+from flask import request, jsonify, current_app
+from sqlalchemy import select, exists
+from sqlalchemy.exc import IntegrityError
+from models import db, Package, Clinic, Hotel
+from doc.swagger_docs import swag_from
+from utils.pagination import paginate, PaginationError, PAGE_PARAMETERS, page_schema
+from utils.streaming import stream_format, stream_rows
+from utils.cache import entity_cache
+from utils.etag import conditional_json
+from utils.fields import Fieldset, FieldsError, FIELDS_PARAMETER
+from utils.suggestions import suggestion_engine
+from utils.bulk import batch_items, invalid_item, existing_ids, existing_keys, insert_rows, item_error, BatchError, BATCH_RESPONSES, NUMBER
+
+
+# Package fields in API responses; ?fields= selects a subset
+PACKAGE_FIELDS = Fieldset({
+    "package_id": Package.id,
+    "name": Package.name,
+    "clinic_id": Package.clinic_id,
+    "hotel_id": Package.hotel_id,
+    "price": Package.price,
+    "itinerary": Package.itinerary,
+})
+serialize_package = PACKAGE_FIELDS.serialize
+
+
+# Whether the clinic and hotel a package refers to both exist, in one round trip
+def references_exist(clinic_id, hotel_id):
+    return all(db.session.execute(select(
+        exists().where(Clinic.id == clinic_id),
+        exists().where(Hotel.id == hotel_id))).one())
+
 
 # Add a new package
 
@@ -52,6 +81,9 @@ from flasgger import swag_from
         '400': {
             'description': 'Missing required fields or invalid input.'
         },
+        '404': {
+            'description': 'Clinic or hotel not found.'
+        },
         '409': {
             'description': 'Package with the same name, clinic, and hotel already exists.'
         }
@@ -64,6 +96,9 @@ def add_package():
     if not all(field in data for field in required_fields):
         return jsonify({"message": "Missing required fields!"}), 400
 
+    if not references_exist(data['clinic_id'], data['hotel_id']):
+        return jsonify({"message": "Invalid clinic or hotel!"}), 404
+
     # Check for duplicates (e.g., by name, clinic_id, and hotel_id)
     existing_package = Package.query.filter_by(
         name=data['name'], clinic_id=data['clinic_id'], hotel_id=data['hotel_id']).first()
@@ -82,8 +117,88 @@ def add_package():
     # Add to database
     db.session.add(new_package)
     db.session.commit()
+    suggestion_engine.invalidate()
     return jsonify({"message": "Package added successfully!"}), 201
 
+# Add several packages in one transaction
+
+
+@swag_from({
+    'tags': ['Package'],
+    'description': 'Add a batch of packages in a single transaction and return a result per item.',
+    'parameters': [
+        {
+            'name': 'items',
+            'in': 'body',
+            'required': True,
+            'description': 'A JSON list of packages, each with the same fields as POST /packages.',
+            'schema': {'type': 'array', 'items': {'type': 'object'}}
+        }
+    ],
+    'responses': BATCH_RESPONSES
+})
+def add_packages_batch():
+    try:
+        items = batch_items()
+    except BatchError as e:
+        return jsonify({"message": str(e)}), 400
+
+    required_fields = ['name', 'clinic_id', 'hotel_id', 'price', 'itinerary']
+    field_types = {'name': str, 'clinic_id': int, 'hotel_id': int, 'price': NUMBER}
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        error = invalid_item(item, required_fields, field_types)
+        if error:
+            results[index] = item_error(index, 400, error)
+        else:
+            valid.append(index)
+
+    # Resolve every referenced clinic and hotel with one query each
+    clinic_ids = existing_ids(Clinic, [items[index]['clinic_id'] for index in valid])
+    hotel_ids = existing_ids(Hotel, [items[index]['hotel_id'] for index in valid])
+    candidates = {}
+    for index in valid:
+        item = items[index]
+        key = (item['name'], item['clinic_id'], item['hotel_id'])
+        if item['clinic_id'] not in clinic_ids or item['hotel_id'] not in hotel_ids:
+            results[index] = item_error(index, 404, "Invalid clinic or hotel!")
+        elif key in candidates:
+            results[index] = item_error(
+                index, 409, "Package with the same name, clinic, and hotel appears twice in this batch!")
+        else:
+            candidates[key] = index
+
+    key_columns = (Package.name, Package.clinic_id, Package.hotel_id)
+    existing = existing_keys(Package, key_columns, candidates)
+    rows = []
+    for key, index in candidates.items():
+        if key in existing:
+            results[index] = item_error(
+                index, 409, "Package with the same name, clinic, and hotel already exists!")
+            continue
+        item = items[index]
+        rows.append({
+            'name': item['name'],
+            'clinic_id': item['clinic_id'],
+            'hotel_id': item['hotel_id'],
+            'price': item['price'],
+            'itinerary': item['itinerary']
+        })
+
+    insert_rows(Package, rows)
+    created = existing_keys(Package, key_columns, [
+        (row['name'], row['clinic_id'], row['hotel_id']) for row in rows])
+    db.session.commit()
+    if rows:
+        suggestion_engine.invalidate()
+
+    for row in rows:
+        key = (row['name'], row['clinic_id'], row['hotel_id'])
+        results[candidates[key]] = {"index": candidates[key], "status": 201,
+                                    "message": "Package added successfully!", "package_id": created[key]}
+    return jsonify({"created": len(rows), "results": results}), 200
+
 # Update a package
 
 
@@ -139,7 +254,7 @@ def add_package():
             'description': 'Package details updated successfully.'
         },
         '404': {
-            'description': 'Package not found.'
+            'description': 'Package, clinic or hotel not found.'
         }
     }
 })
@@ -149,6 +264,10 @@ def update_package(package_id):
         return jsonify({"message": "Package not found!"}), 404
 
     data = request.get_json()
+    if ('clinic_id' in data or 'hotel_id' in data) and not references_exist(
+            data.get('clinic_id', package.clinic_id), data.get('hotel_id', package.hotel_id)):
+        return jsonify({"message": "Invalid clinic or hotel!"}), 404
+
     if 'name' in data:
         package.name = data['name']
     if 'clinic_id' in data:
@@ -161,6 +280,8 @@ def update_package(package_id):
         package.itinerary = data['itinerary']
 
     db.session.commit()
+    entity_cache.invalidate(Package, package_id)
+    suggestion_engine.invalidate()
     return jsonify({"message": "Package details updated successfully!"}), 200
 
 # Delete a package
@@ -184,6 +305,9 @@ def update_package(package_id):
         },
         '404': {
             'description': 'Package not found.'
+        },
+        '409': {
+            'description': 'Package still has bookings.'
         }
     }
 })
@@ -193,7 +317,13 @@ def delete_package(package_id):
         return jsonify({"message": "Package not found!"}), 404
 
     db.session.delete(package)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "Package still has bookings; delete them first."}), 409
+    entity_cache.invalidate(Package, package_id)
+    suggestion_engine.invalidate()
     return jsonify({"message": "Package deleted successfully!"}), 200
 
 # Get all packages
@@ -202,23 +332,21 @@ def delete_package(package_id):
 @swag_from({
     'tags': ['Package'],
     'description': 'Retrieve a list of all available packages.',
+    'parameters': PAGE_PARAMETERS + [FIELDS_PARAMETER],
     'responses': {
         '200': {
             'description': 'List of all packages.',
-            'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object',
-                    'properties': {
-                        'package_id': {'type': 'integer'},
-                        'name': {'type': 'string'},
-                        'clinic_id': {'type': 'integer'},
-                        'hotel_id': {'type': 'integer'},
-                        'price': {'type': 'number'},
-                        'itinerary': {'type': 'string'}
-                    }
+            'schema': page_schema({
+                'type': 'object',
+                'properties': {
+                    'package_id': {'type': 'integer'},
+                    'name': {'type': 'string'},
+                    'clinic_id': {'type': 'integer'},
+                    'hotel_id': {'type': 'integer'},
+                    'price': {'type': 'number'},
+                    'itinerary': {'type': 'string'}
                 }
-            }
+            })
         },
         '404': {
             'description': 'No packages found.'
@@ -226,18 +354,27 @@ def delete_package(package_id):
     }
 })
 def get_all_packages():
-    packages = Package.query.all()
-    if not packages:
+    try:
+        fields = PACKAGE_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    query = PACKAGE_FIELDS.select(fields, extra=('name', 'price'))
+    serialize = PACKAGE_FIELDS.row_serializer(fields)
+
+    fmt = stream_format()
+    if fmt:
+        return stream_rows(query, Package, serialize, fmt)
+
+    try:
+        packages, next_cursor = paginate(
+            query, Package, sort_keys=('name', 'price'))
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+    if not packages and 'after' not in request.args:
         return jsonify({"message": "No packages found."}), 404
 
-    return jsonify([{
-        "package_id": package.id,
-        "name": package.name,
-        "clinic_id": package.clinic_id,
-        "hotel_id": package.hotel_id,
-        "price": package.price,
-        "itinerary": package.itinerary
-    } for package in packages]), 200
+    return jsonify({"items": [serialize(package) for package in packages],
+                    "next": next_cursor}), 200
 
 # Get a specific package by ID
 
@@ -252,7 +389,8 @@ def get_all_packages():
             'type': 'integer',
             'required': True,
             'description': 'The package ID to retrieve.'
-        }
+        },
+        FIELDS_PARAMETER
     ],
     'responses': {
         '200': {
@@ -275,25 +413,22 @@ def get_all_packages():
     }
 })
 def get_package(package_id):
-    package = Package.query.get(package_id)
+    try:
+        fields = PACKAGE_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    package, etag = entity_cache.fetch_tagged(Package, package_id, serialize_package)
     if not package:
         return jsonify({"message": "Package not found!"}), 404
 
-    return jsonify({
-        "package_id": package.id,
-        "name": package.name,
-        "clinic_id": package.clinic_id,
-        "hotel_id": package.hotel_id,
-        "price": package.price,
-        "itinerary": package.itinerary
-    }), 200
+    return conditional_json(*PACKAGE_FIELDS.project(package, etag, fields))
 
 # Suggest packages based on user preferences
 
 
 @swag_from({
     'tags': ['Package'],
-    'description': 'Suggest packages based on user preferences such as budget, location, or procedure.',
+    'description': 'Suggest the best packages for user preferences such as budget, location, or procedure, ranked by price fit, clinic rating, location match and procedure match.',
     'parameters': [
         {
             'name': 'budget',
@@ -315,6 +450,13 @@ def get_package(package_id):
             'type': 'string',
             'required': False,
             'description': 'Preferred procedure offered by the clinic.'
+        },
+        {
+            'name': 'limit',
+            'in': 'json',
+            'type': 'integer',
+            'required': False,
+            'description': 'Number of suggestions to return (default 10, max 100).'
         }
     ],
     'responses': {
@@ -330,23 +472,39 @@ def get_package(package_id):
                         'clinic_id': {'type': 'integer'},
                         'hotel_id': {'type': 'integer'},
                         'price': {'type': 'number'},
-                        'itinerary': {'type': 'string'}
+                        'itinerary': {'type': 'string'},
+                        'score': {'type': 'number'}
                     }
                 }
             }
+        },
+        '400': {
+            'description': 'Invalid budget or limit.'
         }
     }
 })
 def suggest_packages():
-    preferences = request.get_json()
-    query = Package.query
-    if 'budget' in preferences:
-        query = query.filter(Package.price <= float(preferences['budget']))
-    if 'location' in preferences:
-        query = query.join(Clinic).filter(
-            Clinic.location.contains(preferences['location']))
-    if 'procedure' in preferences:
-        query = query.join(Clinic).filter(
-            Clinic.specialties.contains(preferences['procedure']))
-    packages = query.all()
-    return jsonify([package.to_dict() for package in packages]), 200
+    preferences = request.get_json() or {}
+    try:
+        budget = float(preferences['budget']) if 'budget' in preferences else None
+    except (TypeError, ValueError):
+        return jsonify({"message": "Invalid budget!"}), 400
+    try:
+        limit = int(preferences.get('limit', current_app.config['SUGGEST_DEFAULT_LIMIT']))
+    except (TypeError, ValueError):
+        return jsonify({"message": "Invalid limit!"}), 400
+    limit = max(1, min(limit, current_app.config['SUGGEST_MAX_LIMIT']))
+
+    ranked = suggestion_engine.suggest(
+        budget=budget,
+        location=preferences.get('location'),
+        procedure=preferences.get('procedure'),
+        k=limit)
+
+    # Only the K winners are loaded in full
+    packages = {package.id: package for package in Package.query.filter(
+        Package.id.in_([package_id for package_id, _ in ranked]))}
+    return jsonify([
+        dict(serialize_package(packages[package_id]), score=round(score, 4))
+        for package_id, score in ranked if package_id in packages
+    ]), 200
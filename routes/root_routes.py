@@ -1,4 +1,6 @@
 from flask import jsonify, render_template
+from utils.cache import entity_cache
+from utils.compression import response_compressor
 
 
 def root():
@@ -21,3 +23,15 @@ def root():
 
 def home():
     return render_template('home.html')
+
+
+def cache_stats():
+    """
+    Entity cache counters, used to size ENTITY_CACHE_SIZE / ENTITY_CACHE_TTL,
+    and compressed-body cache counters, used to size COMPRESSION_CACHE_SIZE.
+    ---
+    responses:
+        200:
+            description: Hit, miss, stale-hit, eviction and invalidation counters
+    """
+    return jsonify(dict(entity_cache.stats(), compression=response_compressor.stats())), 200
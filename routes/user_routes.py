@@ -1,7 +1,25 @@
-from flask import request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import request, jsonify, g
+from sqlalchemy.exc import IntegrityError
 from models import db, User
-from flasgger import swag_from
+from doc.swagger_docs import swag_from
+from utils.pagination import paginate, PaginationError, PAGE_PARAMETERS, page_schema
+from utils.streaming import stream_format, stream_rows
+from utils.cache import entity_cache
+from utils.etag import conditional_json
+from utils.fields import Fieldset, FieldsError, FIELDS_PARAMETER
+from utils.hashing import password_hasher, HasherBusy
+from utils.tokens import token_auth, token_required, TokenError
+
+
+# User fields in API responses (never the password hash); ?fields= selects
+# a subset
+USER_FIELDS = Fieldset({
+    "user_id": User.id,
+    "username": User.username,
+    "email": User.email,
+    "role": User.role,
+})
+serialize_user = USER_FIELDS.serialize
 
 
 # User Registration Route
@@ -40,6 +58,9 @@ from flasgger import swag_from
         },
         '409': {
             'description': 'User already exists with the same email or username.'
+        },
+        '503': {
+            'description': 'Too many concurrent password hashes; retry after the Retry-After delay.'
         }
     }
 })
@@ -53,8 +74,10 @@ def register():
     if existing_user:
         return jsonify({"message": "A user with the same email or username already exists."}), 409
 
-    hashed_password = generate_password_hash(
-        data['password'], method='pbkdf2:sha256')
+    try:
+        hashed_password = password_hasher.hash(data['password'])
+    except HasherBusy:
+        return jsonify({"message": "Server is busy, please retry shortly."}), 503, {'Retry-After': '1'}
     new_user = User(username=data['username'],
                     email=data['email'], password=hashed_password)
     db.session.add(new_user)
@@ -91,7 +114,10 @@ def register():
                 'properties': {
                     'user_id': {'type': 'integer'},
                     'username': {'type': 'string'},
-                    'role': {'type': 'string'}
+                    'role': {'type': 'string'},
+                    'access_token': {'type': 'string'},
+                    'token_type': {'type': 'string'},
+                    'expires_in': {'type': 'integer'}
                 }
             }
         },
@@ -100,6 +126,9 @@ def register():
         },
         '401': {
             'description': 'Invalid credentials.'
+        },
+        '503': {
+            'description': 'Too many concurrent password checks (retry after the Retry-After delay), or no SECRET_KEY is configured to sign tokens.'
         }
     }
 })
@@ -109,8 +138,26 @@ def login():
         return jsonify({"message": "Invalid input! 'email' and 'password' are required."}), 400
 
     user = User.query.filter_by(email=data['email']).first()
-    if user and check_password_hash(user.password, data['password']):
-        return jsonify({"message": "Login successful!", "user_id": user.id, "username": user.username, "role": user.role}), 200
+    try:
+        valid = user is not None and password_hasher.verify(user.password, data['password'])
+    except HasherBusy:
+        return jsonify({"message": "Server is busy, please retry shortly."}), 503, {'Retry-After': '1'}
+    # Upgrade hashes made with outdated parameters while we have the password;
+    # best effort, so a busy pool never fails an already verified login
+    if valid and password_hasher.needs_rehash(user.password):
+        try:
+            user.password = password_hasher.hash(data['password'])
+            db.session.commit()
+        except HasherBusy:
+            pass
+    if valid:
+        try:
+            token = token_auth.issue(user)
+        except TokenError as e:
+            return jsonify({"message": str(e)}), 503
+        return jsonify({"message": "Login successful!", "user_id": user.id, "username": user.username, "role": user.role,
+                        "access_token": token, "token_type": "Bearer",
+                        "expires_in": token_auth.max_age}), 200
     return jsonify({"message": "Invalid credentials!"}), 401
 
 # Delete a user
@@ -134,6 +181,9 @@ def login():
         },
         '404': {
             'description': 'User not found.'
+        },
+        '409': {
+            'description': 'User still has bookings.'
         }
     }
 })
@@ -142,7 +192,13 @@ def delete_user(user_id):
     if not user:
         return jsonify({"message": "User not found!"}), 404
     db.session.delete(user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "User still has bookings; delete them first."}), 409
+    entity_cache.invalidate(User, user_id)
+    token_auth.revoke_user(user_id)
     return jsonify({"message": "User deleted successfully!"}), 200
 
 # Get all users
@@ -151,21 +207,19 @@ def delete_user(user_id):
 @swag_from({
     'tags': ['User'],
     'description': 'Retrieve all users.',
+    'parameters': PAGE_PARAMETERS + [FIELDS_PARAMETER],
     'responses': {
         '200': {
             'description': 'List of all users.',
-            'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object',
-                    'properties': {
-                        'user_id': {'type': 'integer'},
-                        'username': {'type': 'string'},
-                        'email': {'type': 'string'},
-                        'role': {'type': 'string'}
-                    }
+            'schema': page_schema({
+                'type': 'object',
+                'properties': {
+                    'user_id': {'type': 'integer'},
+                    'username': {'type': 'string'},
+                    'email': {'type': 'string'},
+                    'role': {'type': 'string'}
                 }
-            }
+            })
         },
         '404': {
             'description': 'No users found.'
@@ -173,10 +227,25 @@ def delete_user(user_id):
     }
 })
 def get_all_users():
-    users = User.query.all()
-    if not users:
+    try:
+        fields = USER_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    # Only the serialized columns are selected, never the password hash
+    query = USER_FIELDS.select(fields, extra=('username',))
+    serialize = USER_FIELDS.row_serializer(fields)
+
+    fmt = stream_format()
+    if fmt:
+        return stream_rows(query, User, serialize, fmt)
+
+    try:
+        users, next_cursor = paginate(query, User, sort_keys=('username',))
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+    if not users and 'after' not in request.args:
         return jsonify({"message": "No users found."}), 404
-    return jsonify([{"user_id": user.id, "username": user.username, "email": user.email, "role": user.role} for user in users]), 200
+    return jsonify({"items": [serialize(user) for user in users], "next": next_cursor}), 200
 
 # Get a particular user
 
@@ -191,7 +260,8 @@ def get_all_users():
             'type': 'integer',
             'required': True,
             'description': 'The user ID to retrieve.'
-        }
+        },
+        FIELDS_PARAMETER
     ],
     'responses': {
         '200': {
@@ -212,10 +282,14 @@ def get_all_users():
     }
 })
 def get_user(user_id):
-    user = User.query.get(user_id)
+    try:
+        fields = USER_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    user, etag = entity_cache.fetch_tagged(User, user_id, serialize_user)
     if not user:
         return jsonify({"message": "User not found!"}), 404
-    return jsonify({"user_id": user.id, "username": user.username, "email": user.email, "role": user.role}), 200
+    return conditional_json(*USER_FIELDS.project(user, etag, fields))
 
 # Update a user's role
 
@@ -259,5 +333,73 @@ def update_user_role(user_id):
     if 'role' in data:
         user.role = data['role']
         db.session.commit()
+        entity_cache.invalidate(User, user_id)
+        # Tokens carry the role claim, so outstanding ones must be reissued
+        token_auth.revoke_user(user_id)
         return jsonify({"message": "User role updated successfully!"}), 200
     return jsonify({"message": "No role specified!"}), 400
+
+# Get the user identified by the access token
+
+
+@swag_from({
+    'tags': ['User'],
+    'description': 'Retrieve the user identified by the Bearer access token.',
+    'parameters': [
+        {
+            'name': 'Authorization',
+            'in': 'header',
+            'type': 'string',
+            'required': True,
+            'description': 'Bearer <access_token> as returned by /login.'
+        },
+        FIELDS_PARAMETER
+    ],
+    'responses': {
+        '200': {
+            'description': 'User details.'
+        },
+        '401': {
+            'description': 'Missing, invalid, expired or revoked token.'
+        }
+    }
+})
+@token_required()
+def get_current_user():
+    try:
+        fields = USER_FIELDS.requested()
+    except FieldsError as e:
+        return jsonify({"message": str(e)}), 400
+    user, etag = entity_cache.fetch_tagged(User, g.token_claims['uid'], serialize_user)
+    if not user:
+        return jsonify({"message": "User not found!"}), 404
+    return conditional_json(*USER_FIELDS.project(user, etag, fields))
+
+# Revoke the presented access token
+
+
+@swag_from({
+    'tags': ['User'],
+    'description': 'Revoke the Bearer access token used for this request.',
+    'parameters': [
+        {
+            'name': 'Authorization',
+            'in': 'header',
+            'type': 'string',
+            'required': True,
+            'description': 'Bearer <access_token> as returned by /login.'
+        }
+    ],
+    'responses': {
+        '200': {
+            'description': 'Token revoked.'
+        },
+        '401': {
+            'description': 'Missing, invalid, expired or revoked token.'
+        }
+    }
+})
+@token_required()
+def logout():
+    token_auth.revoke(request.headers['Authorization'][len('Bearer '):].strip())
+    return jsonify({"message": "Logged out successfully!"}), 200
@@ -0,0 +1,100 @@
+"""Concurrent booking stress check.
+
+Starts the app on a scratch SQLite database, gives one clinic a small daily
+capacity and fires many simultaneous POST /bookings requests for the same day
+from a thread pool. Afterwards the number of 201 responses, the bookings
+stored and the clinic_day_load counter must agree and never exceed the
+capacity; unless some requests were shed with 503, they must equal it.
+
+    python scripts/booking_stress.py --threads 32 --requests 500 --capacity 20
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server  # noqa: E402
+from config import Config  # noqa: E402
+
+DAY = '2030-01-15'
+
+
+def seed(capacity):
+    from models import db, User, Clinic, Hotel, Package
+    user = User(username='stress', email='stress@example.com', password='-')
+    clinic = Clinic(name='Stress Clinic', location='Nowhere', contact_info={},
+                    specialties=[], price_range='$', daily_capacity=capacity)
+    hotel = Hotel(name='Stress Hotel', location='Nowhere', amenities=[], price_range='$')
+    db.session.add_all([user, clinic, hotel])
+    db.session.flush()
+    package = Package(name='Stress Package', clinic_id=clinic.id, hotel_id=hotel.id,
+                      price=100.0, itinerary={})
+    db.session.add(package)
+    db.session.commit()
+    return {'user_id': user.id, 'clinic_id': clinic.id, 'package_id': package.id,
+            'appointment_date': DAY}
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--capacity', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='booking-stress-')
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'stress.db')
+    from app import create_app
+    from models import Booking, ClinicDayLoad
+    app = create_app()
+    with app.app_context():
+        payload = seed(args.capacity)
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/bookings'.format(server.server_port)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        statuses = Counter(pool.map(lambda _: post(url, payload), range(args.requests)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    with app.app_context():
+        stored = Booking.query.filter_by(clinic_id=payload['clinic_id']).count()
+        load = ClinicDayLoad.query.filter_by(clinic_id=payload['clinic_id']).one().booked
+
+    print('{} requests from {} threads in {:.2f}s: {}'.format(
+        args.requests, args.threads, elapsed, dict(sorted(statuses.items()))))
+    print('capacity {}, bookings stored {}, day counter {}'.format(args.capacity, stored, load))
+    booked_all = statuses[201] == min(args.capacity, args.requests) or statuses[503]
+    if not (statuses[201] == stored == load <= args.capacity and booked_all):
+        print('FAIL: overbooked or lost bookings')
+        return 1
+    print('OK: no overbooking')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
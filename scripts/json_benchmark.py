@@ -0,0 +1,116 @@
+"""JSON encoder micro-benchmark.
+
+Builds full pages (PAGE_MAX_LIMIT rows by default) of the get_all_* list
+responses from synthetic but realistically shaped rows, run through the
+routes' own serializers, and times how long each JSON_BACKEND takes to
+encode them the way jsonify does. Also checks that both backends produce the
+same document.
+
+    python scripts/json_benchmark.py --rows 1000 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.booking_routes import serialize_booking  # noqa: E402
+from routes.clinic_routes import serialize_clinic  # noqa: E402
+from routes.hotel_routes import serialize_hotel  # noqa: E402
+from routes.package_routes import serialize_package  # noqa: E402
+from routes.user_routes import serialize_user  # noqa: E402
+from utils.json_provider import JSON_BACKENDS, orjson  # noqa: E402
+
+SPECIALTIES = ['Rhinoplasty', 'Dental Implants', 'Hair Transplant', 'Liposuction', 'LASIK']
+AMENITIES = ['Spa', 'Pool', 'Airport Shuttle', 'Free WiFi', 'Restaurant', 'Gym']
+
+
+def bookings(n):
+    start = datetime(2030, 1, 1, 9, 0)
+    return [SimpleNamespace(id=i, user_id=i % 500, clinic_id=i % 40, package_id=i % 120,
+                            status='confirmed', appointment_date=start + timedelta(hours=i))
+            for i in range(1, n + 1)]
+
+
+def clinics(n):
+    return [SimpleNamespace(id=i, name='Clinic {}'.format(i), location='Istanbul, Turkey',
+                            contact_info={'phone': '+90 212 555 {:04d}'.format(i),
+                                          'email': 'info{}@clinic.example'.format(i)},
+                            specialties=SPECIALTIES[:1 + i % len(SPECIALTIES)],
+                            price_range='$$', ratings=4.0 + (i % 10) / 10, daily_capacity=20)
+            for i in range(1, n + 1)]
+
+
+def hotels(n):
+    return [SimpleNamespace(id=i, name='Hotel {}'.format(i), location='Antalya, Turkey',
+                            amenities=AMENITIES[:1 + i % len(AMENITIES)],
+                            price_range='$$$', ratings=3.5 + (i % 15) / 10)
+            for i in range(1, n + 1)]
+
+
+def packages(n):
+    itinerary = {'days': [{'day': d, 'title': 'Day {}'.format(d),
+                           'activities': ['Transfer', 'Consultation', 'Recovery'],
+                           'notes': 'Includes meals and a private driver.'}
+                          for d in range(1, 8)]}
+    return [SimpleNamespace(id=i, name='Package {}'.format(i), clinic_id=i % 40,
+                            hotel_id=i % 30, price=1999.0 + i, itinerary=itinerary)
+            for i in range(1, n + 1)]
+
+
+def users(n):
+    return [SimpleNamespace(id=i, username='user{}'.format(i),
+                            email='user{}@example.com'.format(i), role='normal_user')
+            for i in range(1, n + 1)]
+
+
+PAYLOADS = {
+    'get_all_bookings': (bookings, serialize_booking),
+    'get_all_clinics': (clinics, serialize_clinic),
+    'get_all_hotels': (hotels, serialize_hotel),
+    'get_all_packages': (packages, serialize_package),
+    'get_all_users': (users, serialize_user),
+}
+
+
+# What jsonify() does with the app's encoder (JSON_SORT_KEYS on, compact)
+def encode(encoder, payload):
+    return json.dumps(payload, cls=encoder, sort_keys=True, separators=(',', ':')) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    backends = ['stdlib'] + (['orjson'] if orjson is not None else [])
+    print('{:<18} {:>9} '.format('payload', 'bytes') +
+          ' '.join('{:>10}'.format(name + ' ms') for name in backends) + '   speedup')
+    for name, (rows, serialize) in PAYLOADS.items():
+        payload = {'items': [serialize(row) for row in rows(args.rows)], 'next': 'x' * 40}
+        results = {}
+        for backend in backends:
+            encoder = JSON_BACKENDS[backend]
+            body = encode(encoder, payload)
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                encode(encoder, payload)
+            results[backend] = ((time.perf_counter() - started) * 1000 / args.repeat, body)
+
+        bodies = {json.loads(body) == json.loads(results['stdlib'][1])
+                  for _, body in results.values()}
+        if bodies != {True}:
+            raise SystemExit('{}: backends disagree'.format(name))
+        speedup = ('{:8.1f}x'.format(results['stdlib'][0] / results['orjson'][0])
+                   if 'orjson' in results else '')
+        print('{:<18} {:>9} '.format(name, len(results['stdlib'][1])) +
+              ' '.join('{:>10.2f}'.format(results[b][0]) for b in backends) + speedup)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""List serialization benchmark: ORM objects vs Core rows.
+
+Seeds a scratch SQLite database and builds full list pages two ways: the
+old path (Model.query ... .all(), then a serializer reading attributes of
+each ORM object) and the current one (a Core select from the resource's
+Fieldset, rows mapped through its precompiled row serializer). Reports the
+median time per page and, with tracemalloc, the peak memory allocated while
+building one page. Also checks that both paths produce the same items.
+
+    python scripts/serializer_benchmark.py --rows 1000 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+
+def seed(rows):
+    from models import db, User, Clinic, Hotel, Package, Booking
+    db.session.add_all([
+        User(id=1, username='bench', email='bench@example.com', password='-'),
+        Clinic(id=1, name='Bench Clinic', location='Istanbul', contact_info={},
+               specialties=['Rhinoplasty'], price_range='$$'),
+        Hotel(id=1, name='Bench Hotel', location='Istanbul', amenities=['Spa'], price_range='$$'),
+    ])
+    db.session.flush()
+    itinerary = [{'day': day, 'activity': 'Consultation, treatment and recovery'}
+                 for day in range(1, 8)]
+    db.session.execute(Package.__table__.insert(), [
+        {'name': 'Package {}'.format(i), 'clinic_id': 1, 'hotel_id': 1,
+         'price': 1000.0 + i, 'itinerary': itinerary} for i in range(rows)])
+    start = datetime(2030, 1, 1, 9)
+    db.session.execute(Booking.__table__.insert(), [
+        {'user_id': 1, 'clinic_id': 1, 'package_id': 1, 'status': 'confirmed',
+         'appointment_date': start + timedelta(hours=i)} for i in range(rows)])
+    db.session.commit()
+
+
+def measure(build, repeat):
+    from models import db
+    times = []
+    for _ in range(repeat):
+        db.session.remove()
+        started = time.perf_counter()
+        build()
+        times.append(time.perf_counter() - started)
+    db.session.remove()
+    tracemalloc.start()
+    items = build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.remove()
+    return statistics.median(times) * 1000, peak / 1024, items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='serializer-bench-')
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    from app import create_app
+    from models import db, Booking, Package
+    from routes.booking_routes import BOOKING_FIELDS
+    from routes.package_routes import PACKAGE_FIELDS
+    app = create_app()
+
+    print('{:<18} {:>12} {:>12} {:>14} {:>14}'.format(
+        'page', 'orm ms', 'core ms', 'orm peak KB', 'core peak KB'))
+    with app.app_context():
+        seed(args.rows)
+        for name, model, fields in (('get_all_bookings', Booking, BOOKING_FIELDS),
+                                    ('get_all_packages', Package, PACKAGE_FIELDS)):
+            def orm():
+                rows = model.query.order_by(model.id).limit(args.rows).all()
+                return [fields.serialize(row) for row in rows]
+
+            def core():
+                serialize = fields.row_serializer()
+                rows = db.session.execute(
+                    fields.select().order_by(model.id).limit(args.rows)).all()
+                return [serialize(row) for row in rows]
+
+            orm_ms, orm_peak, orm_items = measure(orm, args.repeat)
+            core_ms, core_peak, core_items = measure(core, args.repeat)
+            if orm_items != core_items:
+                raise SystemExit('{}: ORM and Core pages differ'.format(name))
+            print('{:<18} {:>12.2f} {:>12.2f} {:>14.0f} {:>14.0f}'.format(
+                name, orm_ms, core_ms, orm_peak, core_peak))
+
+
+if __name__ == '__main__':
+    main()
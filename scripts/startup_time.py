@@ -0,0 +1,44 @@
+"""Startup time breakdown.
+
+Runs in a fresh interpreter, so the first build pays the real cold-start
+cost: it reports the import time of `app`, the phases of the first
+create_app() call (as recorded in app.extensions['startup_timings']) and the
+median of a few further builds. Uses the configured database; point DB_URL at
+a scratch copy to measure a database that still needs migrating.
+
+    DOCS_ENABLED=0 python scripts/startup_time.py --builds 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+started = time.perf_counter()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+
+imported = time.perf_counter()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--builds', type=int, default=5,
+                        help='Extra create_app() calls after the first')
+    args = parser.parse_args()
+
+    print('import app: {:8.1f} ms'.format((imported - started) * 1000))
+    timings = create_app().extensions['startup_timings']
+    for name, ms in timings.items():
+        print('  {:<9} {:8.1f} ms'.format(name, ms))
+
+    if args.builds:
+        totals = [create_app().extensions['startup_timings']['total']
+                  for _ in range(args.builds)]
+        print('warm builds: {:8.1f} ms median over {}'.format(
+            statistics.median(totals), args.builds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from config import sqlite_pragmas, use_sqlite_pragmas
+from utils.replicas import replica_router
+
+# Async driver used for each database backend under the ASGI entry point
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+def async_database_uri(uri):
+    scheme, rest = uri.split('://', 1)
+    dialect = scheme.split('+', 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError("No async driver configured for '{}' databases".format(dialect))
+    return '{}://{}'.format(ASYNC_DRIVERS[dialect], rest)
+
+
+# Async engine for the read routes served natively by `asgi.py`. It points at
+# the same database as Flask-SQLAlchemy but through an async driver, so a
+# request waiting on the database parks a coroutine instead of a thread. The
+# pool is a fixed `ASYNC_DB_POOL_SIZE` connections for every backend
+# (aiosqlite would otherwise open a connection, and a thread, per request);
+# further requests wait for a free connection on the event loop. Like the
+# sync session, a request reads from the replica `replica_router` picked for
+# it, if any.
+class AsyncDatabase:
+    def __init__(self, app=None):
+        self.uris = {}
+        self.pool_size = 10
+        self.pragmas = {}
+        self._engines = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.uris = {None: async_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])}
+        for bind, uri in replica_router.replica_uris(app).items():
+            self.uris[bind] = async_database_uri(uri)
+        self.pool_size = app.config['ASYNC_DB_POOL_SIZE']
+        self.pragmas = sqlite_pragmas(app.config)
+        self._engines = {}
+
+    def engine(self, bind=None):
+        if bind not in self._engines:
+            engine = create_async_engine(
+                self.uris[bind], poolclass=AsyncAdaptedQueuePool,
+                pool_size=self.pool_size, max_overflow=0)
+            pragmas = self.pragmas if bind is None else dict(self.pragmas, query_only='ON')
+            use_sqlite_pragmas(engine.sync_engine, pragmas)
+            self._engines[bind] = engine
+        return self._engines[bind]
+
+    def connect(self):
+        return self.engine(replica_router.read_bind()).connect()
+
+    async def dispose(self):
+        engines, self._engines = self._engines, {}
+        for engine in engines.values():
+            await engine.dispose()
+
+
+async_db = AsyncDatabase()
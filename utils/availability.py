@@ -0,0 +1,65 @@
+from datetime import timedelta
+from sqlalchemy import select, exists, literal, or_, Date
+from sqlalchemy.exc import IntegrityError
+from models import db, Clinic, ClinicDayLoad
+
+# Per-clinic daily capacity, tracked through the clinic_day_load counters.
+# Every booking write claims or releases the slot of the (clinic, day) it
+# occupies in the same transaction; cancelled bookings do not occupy a slot.
+
+CANCELLED = 'cancelled'
+
+day_load = ClinicDayLoad.__table__
+
+
+def occupies_slot(status):
+    return status != CANCELLED
+
+
+# Take `count` slots of `clinic_id` on `day` if the clinic's capacity allows
+# it; returns False when the day is full. The capacity check and the
+# increment are a single conditional UPDATE, so the database serializes
+# concurrent claims on the row and none can push the day past capacity. The
+# first claim of a day inserts the counter row instead; if a concurrent
+# request inserts it first, our insert fails on the primary key inside a
+# savepoint and the UPDATE is retried.
+def claim_slots(clinic_id, day, count=1):
+    capacity = select(Clinic.daily_capacity).where(Clinic.id == clinic_id).scalar_subquery()
+    fits = or_(capacity.is_(None), day_load.c.booked + count <= capacity)
+    where = (day_load.c.clinic_id == clinic_id) & (day_load.c.day == day)
+    for _ in range(2):
+        result = db.session.execute(
+            day_load.update().where(where & fits).values(booked=day_load.c.booked + count))
+        if result.rowcount:
+            return True
+        first_claim = select(Clinic.id, literal(day, Date), literal(count)).where(
+            (Clinic.id == clinic_id) &
+            or_(Clinic.daily_capacity.is_(None), Clinic.daily_capacity >= count) &
+            ~exists().where(where))
+        try:
+            with db.session.begin_nested():
+                result = db.session.execute(day_load.insert().from_select(
+                    ['clinic_id', 'day', 'booked'], first_claim))
+        except IntegrityError:
+            continue
+        return result.rowcount > 0
+    return False
+
+
+def release_slots(clinic_id, day, count=1):
+    db.session.execute(day_load.update().where(
+        (day_load.c.clinic_id == clinic_id) & (day_load.c.day == day)
+    ).values(booked=day_load.c.booked - count))
+
+
+# Booked count per day for `clinic_id` over [start, end], including days
+# without bookings; one range scan of the (clinic_id, day) primary key.
+def booked_between(clinic_id, start, end):
+    rows = db.session.execute(
+        select(day_load.c.day, day_load.c.booked).where(
+            (day_load.c.clinic_id == clinic_id) &
+            (day_load.c.day >= start) & (day_load.c.day <= end)))
+    booked = dict(rows.all())
+    days = (end - start).days + 1
+    return [(start + timedelta(days=offset), booked.get(start + timedelta(days=offset), 0))
+            for offset in range(days)]
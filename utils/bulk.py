@@ -0,0 +1,105 @@
+from flask import request, current_app
+from sqlalchemy import select, tuple_
+from models import db
+
+# Helpers for the POST /<resource>/batch routes: every lookup is one
+# set-based query per batch instead of one query per item, and inserts go
+# through a single executemany in the caller's transaction.
+
+# Keys per IN (...) clause, well under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+
+class BatchError(ValueError):
+    pass
+
+
+# The request body is either a JSON list of items or {"items": [...]}.
+def batch_items():
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list) or not data:
+        raise BatchError("Expected a non-empty JSON list of items!")
+    if len(data) > current_app.config['BATCH_MAX_ITEMS']:
+        raise BatchError("A batch may contain at most {} items!".format(
+            current_app.config['BATCH_MAX_ITEMS']))
+    return data
+
+
+# JSON types accepted for numeric fields; bools are rejected even though
+# they are ints in Python.
+NUMBER = (int, float)
+
+
+# A non-negative integer or null, e.g. a clinic's daily_capacity
+def optional_count(value):
+    return value is None or (isinstance(value, int) and not isinstance(value, bool) and value >= 0)
+
+
+def _valid(value, expected):
+    if isinstance(expected, (type, tuple)):
+        return not isinstance(value, bool) and isinstance(value, expected)
+    return expected(value)
+
+
+# Why `item` cannot be inserted as is, or None: it must be an object with
+# every required field, and each field in `field_types` that it carries must
+# be valid. `field_types` maps a field name to a type, a tuple of types or a
+# predicate such as `optional_count`. Checked up front so a malformed item
+# fails alone instead of breaking the batch-wide lookups (e.g. an unhashable
+# list used as a duplicate key).
+def invalid_item(item, required_fields, field_types):
+    if not isinstance(item, dict) or not all(field in item for field in required_fields):
+        return "Missing required fields!"
+    mistyped = [field for field, expected in field_types.items()
+                if field in item and not _valid(item[field], expected)]
+    if mistyped:
+        return "Invalid type for field(s): {}!".format(', '.join(mistyped))
+    return None
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        yield values[start:start + LOOKUP_CHUNK]
+
+
+# Which of `ids` exist in `model`'s table.
+def existing_ids(model, ids):
+    found = set()
+    for chunk in _chunks(set(ids)):
+        found.update(db.session.execute(
+            select(model.id).where(model.id.in_(chunk))).scalars())
+    return found
+
+
+# Map each of `keys` (tuples of `columns` values) that already exists to its
+# row id.
+def existing_keys(model, columns, keys):
+    found = {}
+    for chunk in _chunks(set(keys)):
+        rows = db.session.execute(
+            select(model.id, *columns).where(tuple_(*columns).in_(chunk)))
+        for row in rows:
+            found[tuple(row[1:])] = row[0]
+    return found
+
+
+def insert_rows(model, rows):
+    if rows:
+        db.session.execute(model.__table__.insert(), rows)
+
+
+def item_error(index, status, message):
+    return {"index": index, "status": status, "message": message}
+
+
+BATCH_RESPONSES = {
+    '200': {
+        'description': 'Per-item results; each has the index in the request, a status (201, 400, 404 or 409), a message and the new id when created.'
+    },
+    '400': {
+        'description': 'The payload is not a non-empty list or exceeds the batch size limit.'
+    }
+}
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.exc import OperationalError
+from utils.etag import json_etag
+from utils.invalidation import invalidation_log
+
+
+# Bounded LRU + TTL cache of serialized entities, keyed by (table, id).
+# Each entry also carries the entity's ETag so conditional GETs can be
+# answered without re-serializing.
+#
+# Entries are fresh for `ENTITY_CACHE_TTL` seconds. Expired entries are kept
+# (until evicted) for another `ENTITY_CACHE_STALE_TTL` seconds so they can be
+# served if the database is briefly unavailable. Writes call `invalidate` after
+# committing; a load that raced with an invalidation is not stored, so a
+# reader can never put back the value a writer just replaced. With read
+# replicas, an invalidated key is also not re-cached for
+# READ_YOUR_WRITES_SECONDS, since a lagging replica may still return the old
+# row during that time. Invalidations reach the other worker processes through
+# `invalidation_log` (utils/invalidation.py).
+class EntityCache:
+    def __init__(self, app=None):
+        self.max_size = 10000
+        self.ttl = 60
+        self.stale_ttl = 600
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hold = 0
+        self._held = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_size = app.config['ENTITY_CACHE_SIZE']
+        self.ttl = app.config['ENTITY_CACHE_TTL']
+        self.stale_ttl = app.config['ENTITY_CACHE_STALE_TTL']
+        self.enabled = self.max_size > 0
+        self.hold = app.config['READ_YOUR_WRITES_SECONDS'] \
+            if app.config['SQLALCHEMY_READ_REPLICAS'] else 0
+        self.clear()
+        invalidation_log.subscribe('entity', self._invalidate_published)
+
+    # Return the serialized entity for `model` / `entity_id`, loading it with
+    # `model.query.get` and `serialize` on a miss. Returns None if the row
+    # does not exist; missing rows are not cached.
+    def fetch(self, model, entity_id, serialize):
+        return self.fetch_tagged(model, entity_id, serialize)[0]
+
+    # Like `fetch`, but returns (value, etag); (None, None) if missing.
+    def fetch_tagged(self, model, entity_id, serialize):
+        if not self.enabled:
+            return self._tagged(model.query.get(entity_id), serialize)
+
+        key = (model.__tablename__, entity_id)
+        now = time.monotonic()
+        hit, entry, generation = self._lookup(key, now)
+        if hit:
+            return entry[0], entry[1]
+        try:
+            row = model.query.get(entity_id)
+        except OperationalError:
+            model.query.session.rollback()
+            return self._stale(entry, now)
+        return self._store(key, generation, row, serialize)
+
+    # `fetch_tagged` for the async read routes: `load` is a coroutine
+    # function returning the row (or None) on a miss.
+    async def fetch_tagged_async(self, model, entity_id, serialize, load):
+        if not self.enabled:
+            return self._tagged(await load(), serialize)
+
+        key = (model.__tablename__, entity_id)
+        now = time.monotonic()
+        hit, entry, generation = self._lookup(key, now)
+        if hit:
+            return entry[0], entry[1]
+        try:
+            row = await load()
+        except OperationalError:
+            return self._stale(entry, now)
+        return self._store(key, generation, row, serialize)
+
+    def _lookup(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry, None
+            self.misses += 1
+            return False, entry, self._generation
+
+    # Serve an expired entry while the database is unavailable, or re-raise.
+    def _stale(self, entry, now):
+        if entry is not None and entry[2] + self.stale_ttl > now:
+            with self._lock:
+                self.stale_hits += 1
+            return entry[0], entry[1]
+        raise
+
+    @staticmethod
+    def _tagged(row, serialize):
+        if row is None:
+            return None, None
+        value = serialize(row)
+        return value, json_etag(value)
+
+    def _store(self, key, generation, row, serialize):
+        value, etag = self._tagged(row, serialize)
+        if value is None:
+            return None, None
+        with self._lock:
+            if generation == self._generation and self._held.get(key, 0) <= time.monotonic():
+                self._entries[key] = (value, etag, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value, etag
+
+    def invalidate(self, model, entity_id):
+        self._invalidate((model.__tablename__, entity_id))
+        invalidation_log.publish('entity', '{}:{}'.format(model.__tablename__, entity_id))
+
+    # An invalidation published by another process, as 'table:id'
+    def _invalidate_published(self, key, at):
+        table, entity_id = key.rsplit(':', 1)
+        self._invalidate((table, int(entity_id)))
+
+    def _invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.pop(key, None)
+            if self.hold:
+                now = time.monotonic()
+                self._held = {held: until for held, until in self._held.items() if until > now}
+                self._held[key] = now + self.hold
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._held.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else None
+            }
+
+
+entity_cache = EntityCache()
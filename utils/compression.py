@@ -0,0 +1,122 @@
+import gzip
+import threading
+from collections import OrderedDict
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response types worth compressing
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/javascript')
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compressible(response):
+    return response.mimetype.startswith('text/') or response.mimetype in COMPRESSIBLE_MIMETYPES
+
+
+# gzip / brotli response compression, applied in an after_request hook.
+#
+# A 200 response whose body is at least COMPRESSION_MIN_SIZE bytes is
+# compressed with the client's preferred encoding among
+# COMPRESSION_ENCODINGS ('br' needs the brotli package). Streamed responses
+# and responses that already carry a Content-Encoding are left alone.
+#
+# Responses with an ETag (entity GETs and every other GET, see utils.etag)
+# keep their compressed bodies in a small LRU keyed by (ETag, encoding), so
+# a hot payload is compressed once rather than on every request; the ETag
+# is a hash of the uncompressed body, so a changed payload never hits a stale
+# entry. The ETag of a compressed response is sent as weak (W/"..."), which
+# still matches If-None-Match but is no longer claimed to be byte-identical
+# to the uncompressed representation.
+class ResponseCompressor:
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.encodings = ['gzip']
+        self.max_entries = 256
+        self._variants = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.encodings = [encoding for encoding in app.config['COMPRESSION_ENCODINGS']
+                          if encoding == 'gzip' or (encoding == 'br' and brotli is not None)]
+        self.max_entries = app.config['COMPRESSION_CACHE_SIZE']
+        self.clear()
+        if self.encodings:
+            app.after_request(self.compress_response)
+
+    def clear(self):
+        with self._lock:
+            self._variants.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _compressed(self, response, encoding):
+        etag, weak = response.get_etag()
+        if not etag or weak or self.max_entries <= 0:
+            return compress(response.get_data(), encoding)
+
+        key = (etag, encoding)
+        with self._lock:
+            body = self._variants.get(key)
+            if body is not None:
+                self._variants.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+
+        body = compress(response.get_data(), encoding)
+        with self._lock:
+            self._variants[key] = body
+            self._variants.move_to_end(key)
+            while len(self._variants) > self.max_entries:
+                self._variants.popitem(last=False)
+        return body
+
+    def compress_response(self, response):
+        if response.status_code != 200 or not compressible(response):
+            return response
+        if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return response
+        if len(response.get_data()) < self.min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        response.set_data(self._compressed(response, encoding))
+        response.content_encoding = encoding
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                "encodings": self.encodings,
+                "size": len(self._variants),
+                "max_size": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+response_compressor = ResponseCompressor()
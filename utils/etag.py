@@ -0,0 +1,37 @@
+import hashlib
+import json
+from flask import request, jsonify, current_app
+
+
+# Strong ETag for a JSON-serializable value, independent of key order.
+def json_etag(data):
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+# Respond with `data` tagged with a precomputed `etag`, or with an empty
+# 304 when the client already holds that representation. The body is only
+# serialized when it is actually sent.
+def conditional_json(data, etag):
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(data)
+    response.set_etag(etag)
+    return response
+
+
+# Fallback for every other GET: hash the rendered body and turn the response
+# into a 304 if it matches If-None-Match. Streamed responses are left alone.
+def add_etag(response):
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return response
+    if response.is_streamed or response.direct_passthrough or 'ETag' in response.headers:
+        return response
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def configure_etags(app):
+    app.after_request(add_etag)
+    return app
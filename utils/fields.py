@@ -0,0 +1,118 @@
+from flask import request
+from sqlalchemy import select
+from utils.etag import json_etag
+
+
+class FieldsError(ValueError):
+    pass
+
+
+# The JSON fields of one resource and the model columns they come from.
+#
+# `fields` maps each output name, in response order, to a mapped column
+# attribute, or to (attribute, convert) when the value needs converting
+# (None is passed through unchanged). Two kinds of serializers come out of
+# it:
+#   serialize reads attributes by name, for ORM objects and rows of
+#       select(model.__table__) (the entity cache);
+#   row_serializer(names) maps the plain row tuples of `select(names)`
+#       by position, for list and export routes, which never build ORM
+#       objects, fill the identity map or track changes.
+# Both honour ?fields=name,price sparse fieldsets; `select` then reads only
+# the requested columns, so the others are never read from disk or decoded
+# from JSON.
+class Fieldset:
+    def __init__(self, fields):
+        self.fields = {}
+        for name, spec in fields.items():
+            attribute, convert = spec if isinstance(spec, tuple) else (spec, None)
+            self.fields[name] = (attribute, convert)
+        self.names = tuple(self.fields)
+        self.model = self.fields[self.names[0]][0].class_
+        self.serialize = self._compile(self.names)
+        self._row_serializers = {}
+        self.row_serializer()
+
+    def __call__(self, row):
+        return self.serialize(row)
+
+    def without(self, *names):
+        return Fieldset({name: spec for name, spec in self.fields.items() if name not in names})
+
+    # The field names asked for with ?fields=, in response order, or None
+    # when the parameter is absent or empty (every field).
+    def requested(self):
+        value = request.args.get('fields', '').strip()
+        if not value:
+            return None
+        wanted = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = wanted.difference(self.fields)
+        if unknown:
+            raise FieldsError("Unknown field(s): {}. Allowed: {}".format(
+                ', '.join(sorted(unknown)), ', '.join(self.names)))
+        return tuple(name for name in self.names if name in wanted)
+
+    def columns(self, names=None):
+        return [self.fields[name][0] for name in names or self.names]
+
+    # A Core SELECT of the columns of `names`, in response order, followed by
+    # the primary key and the `extra` attribute names the caller reads itself
+    # (keyset sort keys) when they are not already selected.
+    def select(self, names=None, extra=()):
+        columns = self.columns(names)
+        selected = {column.key for column in columns}
+        for key in ('id',) + tuple(extra):
+            if key not in selected:
+                columns.append(getattr(self.model, key))
+                selected.add(key)
+        return select(*columns)
+
+    def _compile(self, names):
+        plan = [(name, self.fields[name][0].key, self.fields[name][1]) for name in names]
+
+        def serialize(row):
+            data = {}
+            for name, key, convert in plan:
+                value = getattr(row, key)
+                data[name] = convert(value) if convert is not None and value is not None else value
+            return data
+        return serialize
+
+    # Serializer for rows of `self.select(names, ...)`: zips the leading
+    # values with the field names, then applies the few conversions. Built
+    # once per distinct projection.
+    def row_serializer(self, names=None):
+        names = tuple(names or self.names)
+        if names in self._row_serializers:
+            return self._row_serializers[names]
+
+        converts = [(name, self.fields[name][1]) for name in names if self.fields[name][1]]
+
+        def serialize(row):
+            data = dict(zip(names, row))
+            for name, convert in converts:
+                value = data[name]
+                if value is not None:
+                    data[name] = convert(value)
+            return data
+        self._row_serializers[names] = serialize
+        return serialize
+
+    # Cut a serialized entity (e.g. from the entity cache) down to `names`,
+    # re-tagging it; (value, etag) is returned unchanged for every field.
+    @staticmethod
+    def project(value, etag, names):
+        if names is None or value is None:
+            return value, etag
+        value = {name: value[name] for name in names}
+        return value, json_etag(value)
+
+
+# Swagger fragment shared by the GET routes.
+FIELDS_PARAMETER = {
+    'name': 'fields',
+    'in': 'query',
+    'type': 'string',
+    'required': False,
+    'description': 'Comma-separated fields to return, e.g. "name,price" (default: all).'
+}
@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusy(RuntimeError):
+    pass
+
+
+# PBKDF2 hashing and verification run in a small process pool so the CPU work
+# happens outside this process's GIL and request threads only wait on a
+# future. At most `PASSWORD_HASH_MAX_PENDING` jobs may be queued or running;
+# beyond that `HasherBusy` is raised so the caller can shed load (503) instead
+# of piling up threads. A slot is freed when its job finishes, not when the
+# caller stops waiting, so a job whose caller timed out (PASSWORD_HASH_TIMEOUT,
+# also `HasherBusy`) still counts until it is done. With
+# `PASSWORD_HASH_WORKERS = 0` hashing runs inline.
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256:600000'
+        self.workers = 2
+        self.timeout = 10
+        self._slots = threading.BoundedSemaphore(32)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = 'pbkdf2:sha256:{}'.format(app.config['PASSWORD_HASH_ITERATIONS'])
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_MAX_PENDING'])
+
+    def _executor(self):
+        # The pool is created lazily and per process, so a server that forks
+        # after create_app() never shares one pool between workers.
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusy("Too many password operations in progress")
+        try:
+            future = self._executor().submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda future: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Drop the job if it has not started yet; a running one keeps its slot
+            future.cancel()
+            raise HasherBusy("Password operation timed out")
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    # True if `pwhash` was made with different parameters than the current
+    # method (e.g. fewer PBKDF2 iterations).
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+
+password_hasher = PasswordHasher()
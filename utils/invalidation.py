@@ -0,0 +1,173 @@
+import threading
+import time
+from flask import current_app, g
+from sqlalchemy import select, func, or_
+from sqlalchemy.exc import DBAPIError
+from models import db, Invalidation
+
+# Seconds between deletions of expired rows, per process
+PRUNE_INTERVAL = 60
+# How long an id skipped by a poll is looked for again: on databases with
+# concurrent writers, ids can become visible out of order
+GAP_WAIT = 5
+# Larger jumps are pruned or rolled-back ids, not in-flight ones
+MAX_GAP = 100
+
+
+# Invalidations shared by every worker process.
+#
+# The entity cache and token revocations live in process memory, so under a
+# pre-fork server a write handled by one worker would leave the others
+# serving the replaced entity, or accepting a revoked token, until it
+# expired. Each invalidation is therefore also appended to the `invalidation`
+# table, and each worker applies the rows it has not seen yet at the start of
+# a request: one indexed range query on the primary, at most once every
+# INVALIDATION_POLL_MS per process. Requests in between are answered from
+# memory alone (cache hits and replica reads stay off the primary), so
+# another worker's write is seen at most INVALIDATION_POLL_MS late; 0 polls
+# before every request, for exact invalidation.
+#
+# `subscribe(kind, handler)` registers `handler(key, at)`, which applies one
+# invalidation in this process. Kinds registered with replay=True (token
+# revocations) are read from the whole log when a process starts; others
+# only concern state built afterwards. Rows are deleted once older than the
+# longest-lived state they cover (TOKEN_MAX_AGE, or ENTITY_CACHE_TTL +
+# ENTITY_CACHE_STALE_TTL). With SHARED_INVALIDATION off (a single process,
+# the default outside gunicorn.conf.py) the table is neither written nor read.
+class InvalidationLog:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.retention = 3600
+        self.poll_interval = 1.0
+        self._next_poll = 0
+        self._handlers = {}
+        self._replay = set()
+        self._last_id = None
+        self._gaps = {}
+        self._last_prune = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    # Registered before the extensions whose state it invalidates, so its
+    # before_request hook runs ahead of theirs (e.g. token verification).
+    def init_app(self, app):
+        self.enabled = app.config['SHARED_INVALIDATION']
+        self.retention = max(app.config['TOKEN_MAX_AGE'],
+                             app.config['ENTITY_CACHE_TTL'] + app.config['ENTITY_CACHE_STALE_TTL'])
+        self.poll_interval = app.config['INVALIDATION_POLL_MS'] / 1000
+        with self._lock:
+            self._last_id = None
+            self._next_poll = 0
+            self._gaps.clear()
+        if self.enabled:
+            app.before_request(self.poll)
+
+    def subscribe(self, kind, handler, replay=False):
+        self._handlers[kind] = handler
+        if replay:
+            self._replay.add(kind)
+        else:
+            self._replay.discard(kind)
+
+    # Append an invalidation for the other processes; the caller has already
+    # applied it locally. Called after the write it covers has committed, so
+    # a failure is logged rather than failing the request.
+    def publish(self, kind, key, at=None):
+        if not self.enabled:
+            return
+        now = time.time()
+        table = Invalidation.__table__
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.insert().values(
+                    kind=kind, key=str(key), at=now if at is None else at))
+                if now - self._last_prune > PRUNE_INTERVAL:
+                    self._last_prune = now
+                    connection.execute(table.delete().where(table.c.at < now - self.retention))
+        except DBAPIError:
+            current_app.logger.exception(
+                "Could not publish %s invalidation of %s; other workers keep it until it expires",
+                kind, key)
+
+    def _pending(self):
+        table = Invalidation.__table__
+        columns = (table.c.id, table.c.kind, table.c.key, table.c.at)
+        if self._last_id is None:
+            # First poll of this process: only the kinds that must be replayed
+            return select(*columns).where(table.c.kind.in_(self._replay)).order_by(table.c.id), \
+                select(func.max(table.c.id))
+        newer = table.c.id > self._last_id
+        if self._gaps:
+            newer = or_(newer, table.c.id.in_(list(self._gaps)))
+        return select(*columns).where(newer).order_by(table.c.id), None
+
+    # Whether this request should read the log; claims the poll for it, so
+    # concurrent requests do not poll together.
+    def _due(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_poll:
+                return False
+            self._next_poll = now + self.poll_interval
+            return True
+
+    # before_request hook: apply the invalidations published since the last
+    # poll, when one is due. Requests served by asgi.py have already been
+    # through `poll_async`.
+    def poll(self):
+        if g.get('invalidations_polled') or not self._due():
+            return
+        query, latest = self._pending()
+        try:
+            with db.engine.connect() as connection:
+                rows = connection.execute(query).all()
+                latest = connection.execute(latest).scalar() if latest is not None else None
+        except DBAPIError:
+            current_app.logger.warning("Could not read the invalidation log", exc_info=True)
+            return
+        self._apply(rows, latest)
+
+    async def poll_async(self, engine):
+        if not self.enabled:
+            return
+        g.invalidations_polled = True
+        if not self._due():
+            return
+        query, latest = self._pending()
+        try:
+            async with engine.connect() as connection:
+                rows = (await connection.execute(query)).all()
+                if latest is not None:
+                    latest = (await connection.execute(latest)).scalar()
+        except DBAPIError:
+            current_app.logger.warning("Could not read the invalidation log", exc_info=True)
+            return
+        self._apply(rows, latest)
+
+    def _apply(self, rows, latest):
+        now = time.monotonic()
+        with self._lock:
+            if self._last_id is None:
+                self._last_id = latest or 0
+                for _, kind, key, at in rows:
+                    handler = self._handlers.get(kind)
+                    if handler is not None:
+                        handler(key, at)
+                return
+
+            for row_id, kind, key, at in rows:
+                if row_id > self._last_id:
+                    if row_id - self._last_id <= MAX_GAP:
+                        for missing in range(self._last_id + 1, row_id):
+                            self._gaps[missing] = now + GAP_WAIT
+                    self._last_id = row_id
+                elif self._gaps.pop(row_id, None) is None:
+                    continue
+                handler = self._handlers.get(kind)
+                if handler is not None:
+                    handler(key, at)
+            self._gaps = {row_id: until for row_id, until in self._gaps.items() if until > now}
+
+
+invalidation_log = InvalidationLog()
@@ -0,0 +1,58 @@
+from datetime import date, datetime, time
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Response JSON encoding, selected with JSON_BACKEND.
+#
+# Flask 2.0 renders every jsonify() body (and flask.json.dumps, used by the
+# streaming exports) through `app.json_encoder`, so swapping that class
+# changes the encoder for all responses without touching the views. Both
+# encoders write dates and datetimes as ISO 8601 ('2030-01-15',
+# '2030-01-15T09:30:00') instead of Flask's RFC 822 default, so serializers
+# can hand over date objects rather than formatting strings per row, and the
+# two backends produce the same documents.
+class StdlibJSONEncoder(JSONEncoder):
+    def default(self, o):
+        if isinstance(o, (date, datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+# orjson encodes dicts, lists, strings, numbers, dates, datetimes and UUIDs
+# natively, several times faster than the json module; anything else goes
+# through the stdlib encoder's `default`. Output is UTF-8 rather than
+# ASCII-escaped, which is equivalent JSON.
+class OrjsonEncoder(StdlibJSONEncoder):
+    def encode(self, o):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(o, default=self.default, option=option).decode()
+
+
+JSON_BACKENDS = {
+    'orjson': OrjsonEncoder,
+    'stdlib': StdlibJSONEncoder,
+}
+
+
+# The encoder class for `backend`; 'orjson' falls back to the stdlib encoder
+# when orjson is not installed.
+def json_encoder(backend):
+    if backend not in JSON_BACKENDS:
+        raise ValueError("Unknown JSON_BACKEND '{}'".format(backend))
+    if backend == 'orjson' and orjson is None:
+        backend = 'stdlib'
+    return JSON_BACKENDS[backend]
+
+
+def configure_json(app):
+    app.json_encoder = json_encoder(app.config['JSON_BACKEND'])
+    return app
@@ -0,0 +1,153 @@
+import base64
+import json
+from datetime import datetime
+from flask import request, current_app
+from sqlalchemy import and_, or_
+from models import db
+
+
+class PaginationError(ValueError):
+    pass
+
+
+# Cursors are opaque to clients: base64url-encoded JSON of the sort key and
+# the last row's key values, so the next page resumes with a keyset filter
+# instead of an OFFSET scan.
+def encode_cursor(sort, values):
+    payload = json.dumps({'s': sort, 'k': [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor, sort, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload['k']
+    except (ValueError, TypeError, KeyError):
+        raise PaginationError("Invalid cursor!")
+
+    if payload.get('s') != sort or len(values) != len(columns):
+        raise PaginationError("Cursor does not match the requested sort order!")
+
+    decoded = []
+    for column, value in zip(columns, values):
+        if value is not None and column.type.python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise PaginationError("Invalid cursor!")
+        decoded.append(value)
+    return decoded
+
+
+def page_limit():
+    default = current_app.config['PAGE_DEFAULT_LIMIT']
+    maximum = current_app.config['PAGE_MAX_LIMIT']
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        raise PaginationError("'limit' must be an integer!")
+    if limit < 1:
+        raise PaginationError("'limit' must be a positive integer!")
+    return min(limit, maximum)
+
+
+# Apply ?limit=, ?after= and ?sort= to a query ordered by a keyset.
+# `sort_keys` lists the non-nullable columns a client may sort on besides the
+# primary key; prefix with '-' for descending order. The primary key is always
+# the final tie-breaker so every row has a unique position.
+def keyset(query, model, sort_keys=()):
+    sort = request.args.get('sort', 'id')
+    descending = sort.startswith('-')
+    name = sort.lstrip('-')
+    if name != 'id' and name not in sort_keys:
+        raise PaginationError(
+            "Invalid sort key! Allowed: {}".format(', '.join(('id',) + tuple(sort_keys))))
+
+    columns = [model.id] if name == 'id' else [getattr(model, name), model.id]
+    limit = page_limit()
+
+    after = request.args.get('after')
+    if after:
+        values = decode_cursor(after, sort, columns)
+        query = query.filter(_after(columns, values, descending))
+
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    query = query.order_by(*ordering).limit(limit + 1)
+    return query, columns, sort, limit
+
+
+def _after(columns, values, descending):
+    # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y); spelled out because
+    # row-value comparison is not available on every SQLite build.
+    compare = (lambda c, v: c < v) if descending else (lambda c, v: c > v)
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, compare(column, values[i])))
+    return or_(*clauses)
+
+
+# Run a keyset-paginated Core select and return (rows, next_cursor). The
+# select must include the primary key and the sort key columns.
+def paginate(query, model, sort_keys=()):
+    query, columns, sort, limit = keyset(query, model, sort_keys)
+    return page_rows(db.session.execute(query).all(), columns, sort, limit)
+
+
+# Trim the extra row fetched by `keyset` and derive the next cursor from the
+# last row kept.
+def page_rows(rows, columns, sort, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            sort, [getattr(last, column.key) for column in columns])
+    return rows, next_cursor
+
+
+# Swagger fragments shared by the paginated list routes.
+PAGE_PARAMETERS = [
+    {
+        'name': 'limit',
+        'in': 'query',
+        'type': 'integer',
+        'required': False,
+        'description': 'Maximum number of items to return (default 100, max 1000).'
+    },
+    {
+        'name': 'after',
+        'in': 'query',
+        'type': 'string',
+        'required': False,
+        'description': 'Opaque cursor taken from the "next" field of the previous page.'
+    },
+    {
+        'name': 'sort',
+        'in': 'query',
+        'type': 'string',
+        'required': False,
+        'description': 'Sort key, prefixed with "-" for descending order (default "id").'
+    },
+    {
+        'name': 'stream',
+        'in': 'query',
+        'type': 'string',
+        'required': False,
+        'description': 'Stream every matching row instead of one page: "1"/"ndjson" for NDJSON, "json" for a JSON array.'
+    }
+]
+
+
+def page_schema(item_schema):
+    return {
+        'type': 'object',
+        'properties': {
+            'items': {'type': 'array', 'items': item_schema},
+            'next': {'type': 'string', 'description': 'Cursor for the next page, null on the last page.'}
+        }
+    }
@@ -0,0 +1,85 @@
+import random
+import time
+from flask import request, g, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+
+# Methods whose requests may be served from a read replica
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Cookie marking a client that wrote recently, holding the time (epoch
+# seconds) until which its reads stay on the primary
+PRIMARY_COOKIE = 'read_primary_until'
+
+
+# Read/write splitting across SQLALCHEMY_READ_REPLICAS.
+#
+# Each replica URI becomes a Flask-SQLAlchemy bind named `replica_<n>`. At the
+# start of a GET/HEAD request one replica is picked at random, and every query
+# of that request runs on it; all other requests, and anything flushed, use
+# the primary. Replicas lag the primary, so after a successful write the
+# client gets a `read_primary_until` cookie and its reads go to the primary
+# for READ_YOUR_WRITES_SECONDS, which should exceed the replication delay.
+class ReplicaRouter:
+    def __init__(self, app=None):
+        self.binds = []
+        self.window = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        replicas = app.config['SQLALCHEMY_READ_REPLICAS']
+        self.binds = ['replica_{}'.format(index) for index in range(len(replicas))]
+        self.window = app.config['READ_YOUR_WRITES_SECONDS']
+        if not replicas:
+            return
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {}) or {}
+        binds.update(zip(self.binds, replicas))
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.before_request(self.choose_read_bind)
+        app.after_request(self.mark_write)
+
+    def replica_uris(self, app):
+        return {bind: app.config['SQLALCHEMY_BINDS'][bind] for bind in self.binds}
+
+    def _wrote_recently(self):
+        try:
+            return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    # before_request hook: pick the replica this request reads from, if any
+    def choose_read_bind(self):
+        g.read_bind = None
+        if request.method in READ_METHODS and not self._wrote_recently():
+            g.read_bind = random.choice(self.binds)
+
+    # after_request hook: pin the client to the primary after a write
+    def mark_write(self, response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            response.set_cookie(PRIMARY_COOKIE, str(int(time.time() + self.window) + 1),
+                                max_age=self.window, httponly=True, samesite='Lax')
+        return response
+
+    # The replica bind for the current request, or None for the primary
+    # (writes, clients in their read-your-writes window, CLI commands).
+    def read_bind(self):
+        if not self.binds or not has_request_context():
+            return None
+        return g.get('read_bind')
+
+
+replica_router = ReplicaRouter()
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        bind = replica_router.read_bind()
+        if bind is not None and not self._flushing:
+            return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=bind)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -0,0 +1,68 @@
+import re
+from sqlalchemy import inspect, select, table, column, text
+from models import db, Clinic
+
+# Full-text search over clinics, backed by the `clinic_fts` FTS5 table that
+# migration 3 creates on SQLite. The table uses `clinic` as external content
+# and is kept in sync by triggers, so every writer (routes, bulk loads, the
+# shell) updates it. On other databases, or SQLite builds without FTS5,
+# `clinic_fts_enabled()` is False and callers fall back to LIKE filters.
+
+clinic_fts = table('clinic_fts', column('rowid'), column('rank'))
+
+FTS_COLUMNS = ('name', 'location', 'specialties')
+
+_enabled = {}
+
+
+def clinic_fts_enabled():
+    engine = db.engine
+    if engine not in _enabled:
+        _enabled[engine] = engine.dialect.name == 'sqlite' and \
+            inspect(engine).has_table('clinic_fts')
+    return _enabled[engine]
+
+
+# Turn free text into an FTS5 expression where every word must match as a
+# prefix, e.g. "rhino botox" -> ("rhino"* AND "botox"*). Only word characters
+# are kept, so user input can never inject FTS5 syntax.
+def prefix_terms(value):
+    words = re.findall(r'\w+', value, re.UNICODE)
+    if not words:
+        return None
+    return '(' + ' AND '.join('"{}"*'.format(word) for word in words) + ')'
+
+
+# Build a MATCH expression from search parameters: `q` searches every indexed
+# column, while `name`, `location` and `specialties` are restricted to their
+# own column. Returns None when no text filter was given.
+def clinic_match(params):
+    parts = []
+    if params.get('q'):
+        terms = prefix_terms(params['q'])
+        if terms:
+            parts.append(terms)
+    for name in FTS_COLUMNS:
+        if params.get(name):
+            terms = prefix_terms(params[name])
+            if terms:
+                parts.append('{} : {}'.format(name, terms))
+    return ' AND '.join(parts) or None
+
+
+def _matches(match):
+    return text('clinic_fts MATCH :match').bindparams(match=match)
+
+
+# Restrict a Clinic query to full-text matches (unordered).
+def filter_matching(query, match):
+    return query.filter(Clinic.id.in_(
+        select(clinic_fts.c.rowid).where(_matches(match))))
+
+
+# Best `limit` matches, ordered by BM25 relevance.
+def ranked_matches(query, match, limit):
+    return query.join(clinic_fts, clinic_fts.c.rowid == Clinic.id) \
+        .filter(_matches(match)) \
+        .order_by(clinic_fts.c.rank) \
+        .limit(limit)
@@ -0,0 +1,48 @@
+from flask import request, current_app, json, Response, stream_with_context
+from models import db
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+# A client opts into streaming with ?stream=1 (or ?stream=ndjson) or by
+# preferring application/x-ndjson in its Accept header; ?stream=json streams a
+# plain JSON array instead.
+def stream_format():
+    stream = request.args.get('stream', '').lower()
+    if stream in ('1', 'true', 'ndjson'):
+        return 'ndjson'
+    if stream == 'json':
+        return 'json'
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    if best == NDJSON_MIMETYPE:
+        return 'ndjson'
+    return None
+
+
+# Stream every row of the Core select `query` through `serialize` without
+# materializing the result set: rows are fetched `STREAM_CHUNK_SIZE` at a time
+# from a server-side cursor and each one is encoded and written as soon as it
+# is read, so memory use stays flat regardless of table size.
+def stream_rows(query, model, serialize, fmt='ndjson'):
+    chunk_size = current_app.config['STREAM_CHUNK_SIZE']
+
+    def fetch():
+        result = db.session.execute(query.order_by(model.id),
+                                    execution_options={'stream_results': True})
+        yield from result.yield_per(chunk_size)
+
+    def ndjson():
+        for row in fetch():
+            yield json.dumps(serialize(row)) + '\n'
+
+    def json_array():
+        yield '['
+        separator = ''
+        for row in fetch():
+            yield separator + json.dumps(serialize(row))
+            separator = ','
+        yield ']'
+
+    if fmt == 'json':
+        return Response(stream_with_context(json_array()), mimetype='application/json')
+    return Response(stream_with_context(ndjson()), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,116 @@
+import heapq
+import threading
+import time
+from bisect import bisect_right
+from sqlalchemy import select
+from models import db, Package, Clinic
+from utils.terms import normalize_terms
+from utils.invalidation import invalidation_log
+
+
+# Ranked package suggestions served from an in-memory feature table.
+#
+# The table groups packages by clinic: per clinic it keeps the lowercased
+# location, rating, normalized specialties and the clinic's package prices in
+# ascending order. A query scores each clinic once (rating, location match,
+# procedure match), picks its best-fitting package by bisecting the price
+# list, and then merges the per-clinic price lists through a heap until K
+# packages are selected. Package and clinic writes call `invalidate`, which
+# reaches the other worker processes through `invalidation_log`; the table is
+# also rebuilt every `SUGGEST_REFRESH_SECONDS`.
+class SuggestionEngine:
+    def __init__(self, app=None):
+        self.refresh_seconds = 300
+        self.weights = {'price': 1.0, 'rating': 1.0, 'location': 2.0, 'procedure': 3.0}
+        self._table = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.refresh_seconds = app.config['SUGGEST_REFRESH_SECONDS']
+        self.weights = dict(self.weights, **app.config['SUGGEST_WEIGHTS'])
+        self._reset()
+        invalidation_log.subscribe('suggestions', lambda key, at: self._reset())
+
+    def invalidate(self):
+        self._reset()
+        invalidation_log.publish('suggestions', '')
+
+    def _reset(self):
+        with self._lock:
+            self._table = None
+
+    def _features(self):
+        with self._lock:
+            if self._table is None or \
+                    time.monotonic() - self._built_at > self.refresh_seconds:
+                self._table = self._build()
+                self._built_at = time.monotonic()
+            return self._table
+
+    def _build(self):
+        clinics = {
+            clinic_id: ((location or '').lower(), rating or 0.0,
+                        tuple(normalize_terms(specialties)), [], [])
+            for clinic_id, location, rating, specialties in db.session.execute(
+                select(Clinic.id, Clinic.location, Clinic.ratings, Clinic.specialties))
+        }
+        max_price = 0.0
+        for clinic_id, package_id, price in db.session.execute(
+                select(Package.clinic_id, Package.id, Package.price)
+                .order_by(Package.clinic_id, Package.price, Package.id)):
+            clinic = clinics.get(clinic_id)
+            if clinic is None:
+                continue
+            clinic[3].append(price)
+            clinic[4].append(package_id)
+            max_price = max(max_price, price)
+        return [clinic for clinic in clinics.values() if clinic[3]], max_price
+
+    # Return up to `k` (package_id, score) pairs, best first.
+    def suggest(self, budget=None, location=None, procedure=None, k=10):
+        clinics, max_price = self._features()
+        weights = self.weights
+        location = location.lower() if location else None
+        procedure = procedure.strip().lower() if procedure else None
+
+        def price_fit(price):
+            # With a budget, packages that use more of it fit better; without
+            # one, cheaper packages are preferred.
+            if budget is not None:
+                return price / budget if budget > 0 else 1.0
+            return 1 - price / max_price if max_price else 0.0
+
+        heap = []
+        for index, (clinic_location, rating, terms, prices, ids) in enumerate(clinics):
+            base = weights['rating'] * rating / 5
+            if location and location in clinic_location:
+                base += weights['location']
+            if procedure and any(procedure in term for term in terms):
+                base += weights['procedure']
+
+            if budget is not None:
+                position = bisect_right(prices, budget) - 1
+                if position < 0:
+                    continue
+            else:
+                position = 0
+            score = base + weights['price'] * price_fit(prices[position])
+            heap.append((-score, ids[position], index, position, base))
+
+        heapq.heapify(heap)
+        results = []
+        while heap and len(results) < k:
+            score, package_id, index, position, base = heapq.heappop(heap)
+            results.append((package_id, -score))
+            prices, ids = clinics[index][3], clinics[index][4]
+            position += -1 if budget is not None else 1
+            if 0 <= position < len(prices):
+                score = base + weights['price'] * price_fit(prices[position])
+                heapq.heappush(heap, (-score, ids[position], index, position, base))
+        return results
+
+
+suggestion_engine = SuggestionEngine()
@@ -0,0 +1,79 @@
+from sqlalchemy import select, func
+from models import db, ClinicSpecialty, HotelAmenity
+
+# Keep the clinic_specialty / hotel_amenity inverted indexes in step with the
+# JSON columns they are derived from, and query them. Writers call the sync
+# helpers inside the same transaction as the clinic/hotel write.
+
+
+# Normalize a JSON list (or comma-separated string) of terms to a set of
+# lowercase, whitespace-trimmed strings.
+def normalize_terms(values):
+    if values is None:
+        return set()
+    if isinstance(values, str):
+        values = values.split(',')
+    return {str(value).strip().lower()[:100] for value in values if str(value).strip()}
+
+
+def _sync(table, key, entity_id, term_column, values, connection=None):
+    connection = connection or db.session
+    connection.execute(table.delete().where(table.c[key] == entity_id))
+    terms = normalize_terms(values)
+    if terms:
+        connection.execute(table.insert(), [
+            {key: entity_id, term_column: term} for term in sorted(terms)])
+
+
+def sync_clinic_specialties(clinic_id, specialties, connection=None):
+    _sync(ClinicSpecialty.__table__, 'clinic_id', clinic_id,
+          'specialty', specialties, connection)
+
+
+def sync_hotel_amenities(hotel_id, amenities, connection=None):
+    _sync(HotelAmenity.__table__, 'hotel_id', hotel_id,
+          'amenity', amenities, connection)
+
+
+def _having_all(key, term_column, terms):
+    terms = normalize_terms(terms)
+    return select(key) \
+        .where(term_column.in_(terms)) \
+        .group_by(key) \
+        .having(func.count(term_column) == len(terms))
+
+
+# Subquery of clinic ids offering every one of `specialties`.
+def clinics_offering(specialties):
+    return _having_all(ClinicSpecialty.clinic_id, ClinicSpecialty.specialty, specialties)
+
+
+# Subquery of hotel ids providing every one of `amenities`.
+def hotels_providing(amenities):
+    return _having_all(HotelAmenity.hotel_id, HotelAmenity.amenity, amenities)
+
+
+# Split a repeatable / comma-separated query parameter into terms.
+def term_args(args, name):
+    values = []
+    for value in args.getlist(name):
+        values.extend(value.split(','))
+    return normalize_terms(values)
+
+
+# Index the terms of freshly inserted rows in one executemany per table;
+# `values_by_id` maps each new clinic/hotel id to its JSON terms.
+def add_clinic_specialties(values_by_id):
+    rows = [{'clinic_id': clinic_id, 'specialty': term}
+            for clinic_id, values in values_by_id.items()
+            for term in sorted(normalize_terms(values))]
+    if rows:
+        db.session.execute(ClinicSpecialty.__table__.insert(), rows)
+
+
+def add_hotel_amenities(values_by_id):
+    rows = [{'hotel_id': hotel_id, 'amenity': term}
+            for hotel_id, values in values_by_id.items()
+            for term in sorted(normalize_terms(values))]
+    if rows:
+        db.session.execute(HotelAmenity.__table__.insert(), rows)
@@ -0,0 +1,159 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify, g
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from utils.invalidation import invalidation_log
+
+
+class TokenError(ValueError):
+    pass
+
+
+# Keys that must never sign tokens: anyone could mint their own with them
+PLACEHOLDER_SECRET_KEYS = {'your_secret_key', 'changeme', 'secret'}
+
+
+# Signed, expiring access tokens issued by `login`.
+#
+# A token is an itsdangerous-signed payload {uid, role, iat, jti} keyed with
+# SECRET_KEY, so verifying one needs no database access. Verified claims are
+# kept in a small LRU so repeat requests skip the HMAC as well. Revocation is
+# in memory: `revoke_user` rejects every token a user was issued before now
+# (used when their role changes or they are deleted) and `revoke` rejects a
+# single token. Revocations are forgotten once the tokens they cover expire.
+# They reach the other worker processes through `invalidation_log`
+# (utils/invalidation.py), which also replays them into a new process.
+# Without a real SECRET_KEY (unset, or a placeholder), no token is issued or
+# accepted.
+class TokenAuth:
+    def __init__(self, app=None):
+        self.max_age = 3600
+        self.cache_size = 10000
+        self._serializer = None
+        self._verified = OrderedDict()
+        self._revoked_users = {}
+        self._revoked_tokens = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_age = app.config['TOKEN_MAX_AGE']
+        self.cache_size = app.config['TOKEN_CACHE_SIZE']
+        key = app.config.get('SECRET_KEY')
+        if not key or key in PLACEHOLDER_SECRET_KEYS:
+            self._serializer = None
+            app.logger.warning("SECRET_KEY is not set; access tokens are disabled")
+        else:
+            self._serializer = URLSafeTimedSerializer(key, salt='access-token')
+        with self._lock:
+            self._verified.clear()
+        invalidation_log.subscribe('user', self._revoke_user_at, replay=True)
+        invalidation_log.subscribe('token', self._revoke_token_until, replay=True)
+        app.before_request(self.load_request_claims)
+
+    @property
+    def enabled(self):
+        return self._serializer is not None
+
+    def issue(self, user):
+        if not self.enabled:
+            raise TokenError("Access tokens are disabled until SECRET_KEY is set!")
+        return self._serializer.dumps({
+            'uid': user.id,
+            'role': user.role,
+            'iat': time.time(),
+            'jti': secrets.token_urlsafe(8),
+        })
+
+    def verify(self, token):
+        if not self.enabled:
+            raise TokenError("Invalid token!")
+        now = time.time()
+        with self._lock:
+            cached = self._verified.get(token)
+            if cached is not None:
+                self._verified.move_to_end(token)
+        if cached is not None and cached[1] > now:
+            claims = cached[0]
+        else:
+            try:
+                claims = self._serializer.loads(token, max_age=self.max_age)
+            except SignatureExpired:
+                raise TokenError("Token has expired!")
+            except BadSignature:
+                raise TokenError("Invalid token!")
+            with self._lock:
+                self._verified[token] = (claims, claims['iat'] + self.max_age)
+                while len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+
+        if claims['jti'] in self._revoked_tokens or \
+                claims['iat'] <= self._revoked_users.get(claims['uid'], 0):
+            raise TokenError("Token has been revoked!")
+        return claims
+
+    def revoke(self, token):
+        claims = self.verify(token)
+        expires = claims['iat'] + self.max_age
+        self._revoke_token_until(claims['jti'], expires)
+        with self._lock:
+            self._verified.pop(token, None)
+        invalidation_log.publish('token', claims['jti'], expires)
+
+    def revoke_user(self, user_id):
+        now = time.time()
+        self._revoke_user_at(user_id, now)
+        invalidation_log.publish('user', user_id, now)
+
+    def _revoke_user_at(self, user_id, at):
+        user_id = int(user_id)
+        with self._lock:
+            self._revoked_users[user_id] = max(at, self._revoked_users.get(user_id, 0))
+            self._prune()
+
+    def _revoke_token_until(self, jti, expires):
+        with self._lock:
+            self._revoked_tokens[jti] = expires
+            self._prune()
+
+    def _prune(self):
+        horizon = time.time() - self.max_age
+        for user_id in [u for u, at in self._revoked_users.items() if at < horizon]:
+            del self._revoked_users[user_id]
+        now = time.time()
+        for jti in [j for j, expires in self._revoked_tokens.items() if expires < now]:
+            del self._revoked_tokens[jti]
+
+    # before_request hook: expose the caller's claims as `g.token_claims`
+    # (None without an Authorization: Bearer header).
+    def load_request_claims(self):
+        g.token_claims = None
+        g.token_error = None
+        header = request.headers.get('Authorization', '')
+        if header.startswith('Bearer '):
+            try:
+                g.token_claims = self.verify(header[len('Bearer '):].strip())
+            except TokenError as e:
+                g.token_error = str(e)
+
+
+token_auth = TokenAuth()
+
+
+# Require a valid access token, optionally with one of `roles`.
+def token_required(*roles):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            claims = g.get('token_claims')
+            if claims is None:
+                return jsonify({"message": g.get('token_error') or "Missing access token!"}), 401
+            if roles and claims['role'] not in roles:
+                return jsonify({"message": "Insufficient role!"}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,7 @@
+# wsgi.py
+#
+# Production WSGI entry point, loaded once by the pre-fork server before it
+# forks its workers: `gunicorn -c gunicorn.conf.py` (see gunicorn.conf.py).
+from app import create_app
+
+app = create_app()